@@ -1,12 +1,34 @@
-from collections import Counter
+import hashlib
+import json
 import os
-from werkzeug.utils import secure_filename
 
-from flask import Flask, render_template, request, flash, redirect, url_for
+from flask import (Flask, Response, render_template, request, flash, redirect, url_for, jsonify,
+                   stream_with_context, make_response, session, stream_template, get_flashed_messages)
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from sqlalchemy import desc, or_, func
+from sqlalchemy import or_, select
 from config import Config
 from models import db, User, WardrobeItem, UserProfile
+from pagination import CursorError, paginate, paginate_snapshot
+import bulk
+import cache
+import colors
+import database
+import duplicates
+import facets
+import images
+import metrics
+import migrations
+import outfits
+import passwords
+import precompute
+import rules
+import search
+import storage
+import tags
+import transfer
+import uploads
 
 # -----------------------------
 # App Factory
@@ -16,7 +38,10 @@ def create_app():
     app.config.from_object(Config)
 
     # Init DB
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app, db)
+    metrics.init_app(app, db)
 
     # Init Login
     login_manager = LoginManager()
@@ -27,12 +52,22 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id: str):
-        return db.session.get(User, int(user_id))
-
-    # Create tables and seed demo user (DEV-ONLY)
-    with app.app_context():
-        db.create_all()
-        ensure_demo_user()  # DEV-ONLY: remove before production
+        return cache.users().load(int(user_id))
+
+    # Schema changes run from `flask db-upgrade`, never at boot
+    migrations.init_app(app)
+    search.init_app(app)
+    tags.init_app(app)
+    colors.init_app(app)
+    images.init_app(app)
+    duplicates.init_app(app)
+    facets.init_app(app)
+    cache.init_app(app)
+    rules.init_app(app)
+    transfer.init_app(app)
+    passwords.init_app(app)
+    uploads.init_app(app)
+    precompute.init_app(app)
 
     return app
 
@@ -42,22 +77,28 @@ def create_app():
 def ensure_demo_user():
     email = 'demo@glamdiva.dev'
     if not User.query.filter_by(email=email).first():
-        u = User(name='Demo User', email=email)
-        u.set_password('demo123')
+        u = User(name='Demo User', email=email, password_hash=passwords.hash_password('demo123'))
         db.session.add(u)
         db.session.commit()
 
-# Build the app instance
+# Build the app instance (no database access; see `flask db-upgrade`)
 app = create_app()
 
+@app.cli.command('create-demo-user')
+def create_demo_user_command():
+    """DEV-ONLY: create demo@glamdiva.dev / demo123."""
+    ensure_demo_user()
+
 # -----------------------------
 # Uploads configuration
 # -----------------------------
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 8 * 1024 * 1024  # 8MB
+
+# Changes whenever the wardrobe templates are redeployed, so browsers don't keep a stale 304
+TEMPLATE_FINGERPRINT = '-'.join(
+    str(int(os.stat(os.path.join(app.root_path, 'templates', name)).st_mtime))
+    for name in ('wardrobe.html', 'wardrobe-items.html')
+)
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -69,7 +110,7 @@ def allowed_file(filename: str) -> bool:
 def dev_login():
     user = User.query.filter_by(email='demo@glamdiva.dev').first()
     if not user:
-        return 'Demo user not found. Restart app to auto-create it.', 404
+        return 'Demo user not found. Run `flask --app app create-demo-user` (or start with python app.py).', 404
     login_user(user)
     return redirect(url_for('index'))
 
@@ -101,12 +142,15 @@ def signup():
             return render_template('signup.html')
 
         try:
-            user = User(name=name, email=email)
-            user.set_password(password)
+            user = User(name=name, email=email, password_hash=passwords.hash_password(password))
             db.session.add(user)
             db.session.commit()
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
+        except passwords.HashingBusy:
+            db.session.rollback()
+            flash('We are busy right now. Please try again in a moment.', 'error')
+            return render_template('signup.html'), 503
         except Exception:
             db.session.rollback()
             flash('Registration failed. Please try again.', 'error')
@@ -124,7 +168,17 @@ def login():
             return render_template('login.html')
 
         user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        try:
+            ok = user is not None and passwords.check_and_upgrade(user, password)
+        except passwords.HashingBusy:
+            flash('We are busy right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        if ok:
+            if db.session.is_modified(user):
+                try:
+                    db.session.commit()  # password re-hashed under the current policy
+                except Exception:
+                    db.session.rollback()
             login_user(user)
             flash(f'Welcome back, {user.name}!', 'success')
             next_page = request.args.get('next')
@@ -171,7 +225,12 @@ def edit_profile():
             if password != confirm:
                 flash('Passwords do not match.', 'error')
                 return render_template('edit-profile.html', user=current_user)
-            current_user.set_password(password)
+            try:
+                current_user.password_hash = passwords.hash_password(password)
+            except passwords.HashingBusy:
+                db.session.rollback()
+                flash('We are busy right now. Please try again in a moment.', 'error')
+                return render_template('edit-profile.html', user=current_user), 503
 
         try:
             db.session.commit()
@@ -189,6 +248,7 @@ def edit_profile():
 # -----------------------------
 @app.route('/wardrobe', methods=['GET', 'POST'])
 @login_required
+@database.read_replica
 def wardrobe():
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -196,60 +256,251 @@ def wardrobe():
         color = request.form.get('color', '').strip()
         notes = request.form.get('notes', '').strip()
 
-        # File handling
-        image_url = None
         file = request.files.get('image')
-        if file and file.filename:
-            if allowed_file(file.filename):
-                fname = secure_filename(file.filename)
-                base, ext = os.path.splitext(fname)
-                # unique filename per user + timestamp
-                fname = f"{current_user.id}_{base}_{int(__import__('time').time())}{ext.lower()}"
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], fname)
-                file.save(save_path)
-                image_url = f"/static/uploads/{fname}"
-            else:
-                flash('Unsupported image format. Allowed: png, jpg, jpeg, gif, webp.', 'error')
-                return redirect(url_for('wardrobe'))
+        if file and file.filename and not allowed_file(file.filename):
+            flash('Unsupported image format. Allowed: png, jpg, jpeg, gif, webp.', 'error')
+            return redirect(url_for('wardrobe'))
 
         if not name or not category:
             flash('Name and category are required.', 'error')
         else:
             try:
+                # File handling: stored once per distinct content
+                image_url = image_hash = None
+                if file and file.filename:
+                    image_hash, image_url = storage.save_upload(file)
+
                 item = WardrobeItem(
                     user_id=current_user.id,
                     name=name,
                     category=category,
                     color=color or None,
                     notes=notes or None,
-                    image_url=image_url
+                    image_url=image_url,
+                    image_hash=image_hash,
+                    image_status='pending' if image_url else None
                 )
                 db.session.add(item)
+                similar = duplicates.fingerprint_upload(item) if image_url else []
+                cache.invalidate_recommendations(current_user)
                 db.session.commit()
+                if image_url:
+                    images.enqueue(item)
                 flash('Item added to wardrobe.', 'success')
+                if similar:
+                    flash(duplicates.duplicate_message(similar), 'info')
                 return redirect(url_for('wardrobe'))
             except Exception:
                 db.session.rollback()
                 flash('Failed to add item. Please try again.', 'error')
 
     q = request.args.get('q', '').strip()
-    category = request.args.get('category', '').strip()
-    sort = request.args.get('sort', 'newest')
+    selection = facets.Selection.from_args(request.args)
+    sort = request.args.get('sort') or ('relevance' if q else 'newest')
+    cursor = request.args.get('cursor') or None
+
+    # never part of the cached user snapshot, so this is a fresh read
+    version, updated_at = current_user.data_version, current_user.updated_at
+    etag = wardrobe_etag(current_user.id, version or 0, request.query_string)
+    pending_flash = bool(session.get('_flashes'))
+    if not pending_flash and not is_resource_modified(request.environ, etag=etag, last_modified=updated_at):
+        return conditional_headers(Response(status=304), etag, updated_at)
 
-    query = WardrobeItem.query.filter_by(user_id=current_user.id)
-    if category:
-        query = query.filter(WardrobeItem.category == category)
-    if q:
-        like = f"%{q}%"
-        query = query.filter(or_(WardrobeItem.name.ilike(like), WardrobeItem.notes.ilike(like)))
+    if request.args.get('all'):
+        return stream_wardrobe(q, selection, sort, etag, updated_at, pending_flash)
+
+    per_page = app.config['WARDROBE_PAGE_SIZE']
+    try:
+        grid = wardrobe_grid(current_user.id, version or 0, q, selection, sort, cursor, per_page)
+    except CursorError:
+        flash('That page link has expired. Showing the first page.', 'info')
+        grid = wardrobe_grid(current_user.id, version or 0, q, selection, sort, None, per_page)
+        pending_flash = True
+
+    response = make_response(render_template(
+        'wardrobe.html',
+        items_html=Markup(grid['html']),
+        facets=facets.for_user(current_user.id),
+        q=q, selection=selection, sort=grid['sort']
+    ))
+    if pending_flash:
+        return response  # flashes make this render one-off; don't let it be revalidated
+    return conditional_headers(response, etag, updated_at)
+
+def stream_wardrobe(q, selection, sort, etag, updated_at, pending_flash):
+    """The whole (filtered) closet on one page, streamed.
+
+    Rows are read in batches as the template reaches them, so the header and
+    filter bar go out before the grid and memory doesn't grow with the closet.
+    """
+    rows, sort = wardrobe_rows(current_user.id, q, selection, sort, app.config['WARDROBE_STREAM_BATCH'])
+    get_flashed_messages()  # pop flashes now: the session cookie is sent before the body
+    body = stream_template('wardrobe.html', items=rows, streamed=True, facets=facets.for_user(current_user.id),
+                           q=q, selection=selection, sort=sort)
+    response = Response(flush_every(body, app.config['WARDROBE_STREAM_FLUSH']), mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks straight through
+    if pending_flash:
+        return response
+    return conditional_headers(response, etag, updated_at)
+
+def flush_every(chunks, size: int):
+    """Coalesce Jinja's many tiny chunks into writes of roughly `size` characters."""
+    buf, buffered = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buf)
+            buf, buffered = [], 0
+    if buf:
+        yield ''.join(buf)
+
+def wardrobe_etag(user_id: int, version: int, query_string: bytes) -> str:
+    raw = b'%d:%d:%s:%s' % (user_id, version, query_string, TEMPLATE_FINGERPRINT.encode())
+    return hashlib.sha1(raw).hexdigest()
+
+def conditional_headers(response, etag: str, last_modified):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # always revalidate; a 304 is cheap
+    response.vary.add('Cookie')
+    return response
+
+def wardrobe_grid(user_id, version, q, selection, sort, cursor, per_page) -> dict:
+    """Rendered item grid for one view, cached until the user's wardrobe changes."""
+    params = json.dumps([q, *selection, sort, cursor, per_page])
+    key = f'frag:wardrobe:{user_id}:{version}:{hashlib.sha1(params.encode()).hexdigest()}'
+
+    def compute():
+        page, resolved_sort = wardrobe_page(user_id, q, selection, sort, cursor, per_page)
+        html = render_template(
+            'wardrobe-items.html',
+            items=page.items,
+            next_cursor=page.next_cursor,
+            paged=bool(cursor),
+            q=q, selection=selection, sort=resolved_sort
+        )
+        return {'html': html, 'sort': resolved_sort}
+
+    return cache.fragments().get_or_compute(key, compute)
+
+def wardrobe_query(user_id, q, selection, sort):
+    """Filtered wardrobe query and its total ordering; returns (query, sort, keys, descending)."""
+    query = selection.apply(WardrobeItem.query.filter_by(user_id=user_id))
+    matches = search.search_matches(user_id, q) if q else None
+    if matches is not None:
+        query = query.join(matches, matches.c.item_id == WardrobeItem.id)
 
     if sort == 'name':
-        query = query.order_by(WardrobeItem.name.asc())
-    else:
-        query = query.order_by(desc(WardrobeItem.created_at))
+        return query, sort, [WardrobeItem.name, WardrobeItem.id], False
+    if sort == 'relevance' and matches is not None:
+        return query, sort, [matches.c.rank, WardrobeItem.id], False
+    return query, 'newest', [WardrobeItem.created_at, WardrobeItem.id], True
+
+def wardrobe_page(user_id, q, selection, sort, cursor=None, limit=50):
+    """One keyset page of a user's wardrobe; returns (page, effective sort)."""
+    query, sort, keys, descending = wardrobe_query(user_id, q, selection, sort)
+    if sort == 'relevance':
+        # ranks shift with any write to the index, so relevance pages come from a frozen snapshot
+        page = paginate_snapshot(query, sort, keys, cache.fragments().backend, cursor, limit,
+                                 app.config['WARDROBE_SEARCH_SNAPSHOT_TTL'])
+        return page, sort
+    return paginate(query, sort, keys, cursor, limit, descending=descending), sort
+
+# columns wardrobe-items.html reads; plain rows keep the session's identity map empty
+GRID_COLUMNS = (
+    WardrobeItem.id, WardrobeItem.name, WardrobeItem.category, WardrobeItem.color,
+    WardrobeItem.notes, WardrobeItem.image_url, WardrobeItem.thumb_url,
+)
+
+def wardrobe_rows(user_id, q, selection, sort, batch_size=500):
+    """Every matching item, fetched `batch_size` rows at a time; returns (row iterator, effective sort)."""
+    query, sort, keys, descending = wardrobe_query(user_id, q, selection, sort)
+    order = [k.desc() if descending else k.asc() for k in keys]
+    rows = query.with_entities(*GRID_COLUMNS).order_by(*order).yield_per(batch_size)
+    return iter(rows), sort  # executes now, while the view still owns the request
+
+@app.route('/api/wardrobe')
+@login_required
+@database.read_replica
+def api_wardrobe():
+    q = request.args.get('q', '').strip()
+    selection = facets.Selection.from_args(request.args)
+    sort = request.args.get('sort') or ('relevance' if q else 'newest')
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = min(max(int(request.args.get('limit', app.config['WARDROBE_PAGE_SIZE'])), 1), 200)
+    except ValueError:
+        return jsonify(error='limit must be an integer.'), 400
+
+    try:
+        page, sort = wardrobe_page(current_user.id, q, selection, sort, cursor, limit)
+    except CursorError as exc:
+        return jsonify(error=str(exc)), 400
+
+    return jsonify(
+        items=[it.to_dict() for it in page.items],
+        next_cursor=page.next_cursor,
+        sort=sort
+    )
+
+@app.route('/api/wardrobe/facets')
+@login_required
+@database.read_replica
+def api_wardrobe_facets():
+    return jsonify(facets=facets.for_user(current_user.id))
+
+@app.route('/wardrobe/edit/<int:item_id>', methods=['GET', 'POST'])
+@login_required
+def edit_wardrobe_item(item_id):
+    item = WardrobeItem.query.filter_by(id=item_id, user_id=current_user.id).first()
+    if not item:
+        flash('Item not found or not authorized.', 'error')
+        return redirect(url_for('wardrobe'))
+
+    if request.method == 'POST':
+        name = request.form.get('name', '').strip()
+        category = request.form.get('category', '').strip()
+        color = request.form.get('color', '').strip()
+        notes = request.form.get('notes', '').strip()
+
+        if not name or not category:
+            flash('Name and category are required.', 'error')
+            return render_template('wardrobe-edit.html', item=item)
+
+        file = request.files.get('image')
+        if file and file.filename:
+            if allowed_file(file.filename):
+                storage.release(item.image_hash)
+                item.image_hash, item.image_url = storage.save_upload(file)
+                item.thumb_url = item.webp_url = item.image_colors = None
+                item.image_status = 'pending'
+            else:
+                flash('Unsupported image format. Allowed: png, jpg, jpeg, gif, webp.', 'error')
+                return render_template('wardrobe-edit.html', item=item)
+
+        item.name = name
+        item.category = category
+        if (color or None) != item.color:
+            item.color_detected = False  # typed by the user from now on
+        item.color = color or None
+        item.notes = notes or None
+        try:
+            similar = duplicates.fingerprint_upload(item) if item.image_status == 'pending' else []
+            cache.invalidate_recommendations(current_user)
+            db.session.commit()
+            if item.image_status == 'pending':
+                images.enqueue(item)
+            flash('Item updated.', 'success')
+            if similar:
+                flash(duplicates.duplicate_message(similar), 'info')
+            return redirect(url_for('wardrobe'))
+        except Exception:
+            db.session.rollback()
+            flash('Failed to update item. Please try again.', 'error')
 
-    items = query.all()
-    return render_template('wardrobe.html', items=items, q=q, category=category, sort=sort)
+    return render_template('wardrobe-edit.html', item=item)
 
 @app.route('/wardrobe/delete/<int:item_id>', methods=['POST'])
 @login_required
@@ -259,7 +510,9 @@ def delete_wardrobe_item(item_id):
         flash('Item not found or not authorized.', 'error')
         return redirect(url_for('wardrobe'))
     try:
+        storage.release(item.image_hash)
         db.session.delete(item)
+        cache.invalidate_recommendations(current_user)
         db.session.commit()
         flash('Item deleted.', 'success')
     except Exception:
@@ -267,17 +520,197 @@ def delete_wardrobe_item(item_id):
         flash('Failed to delete item.', 'error')
     return redirect(url_for('wardrobe'))
 
+@app.route('/wardrobe/bulk', methods=['POST'])
+@login_required
+def bulk_wardrobe():
+    category = request.form.get('category')
+    try:
+        result = bulk.apply(current_user, request.form.get('action'), request.form.getlist('ids'),
+                            category=category, color=request.form.get('color'))
+        db.session.commit()
+        flash(bulk.summary(result, category), 'success' if result.updated else 'info')
+    except bulk.BulkError as exc:
+        db.session.rollback()
+        flash(str(exc), 'error')
+    except Exception:
+        db.session.rollback()
+        flash('Failed to update the selected items.', 'error')
+    return redirect(url_for('wardrobe'))
+
+@app.route('/api/wardrobe/bulk', methods=['POST'])
+@login_required
+def api_bulk_wardrobe():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(error='Send a JSON object.'), 400
+    try:
+        result = bulk.apply(current_user, data.get('action'), data.get('ids'),
+                            category=data.get('category'), color=data.get('color'))
+        db.session.commit()
+    except bulk.BulkError as exc:
+        db.session.rollback()
+        return jsonify(error=str(exc)), exc.status
+    return jsonify(result.to_dict())
+
+# -----------------------------
+# Wardrobe import / export
+# -----------------------------
+def run_import():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return None, 'Choose a CSV or JSONL file to import.'
+    fmt = request.form.get('format') or transfer.guess_format(file.filename)
+    if fmt not in transfer.FORMATS:
+        return None, 'Unsupported import format. Allowed: csv, jsonl.'
+    return transfer.import_items(current_user, file.stream, fmt), None
+
+@app.route('/wardrobe/import', methods=['POST'])
+@login_required
+def import_wardrobe():
+    result, problem = run_import()
+    if problem:
+        flash(problem, 'error')
+    elif result.skipped:
+        flash(f'Imported {result.imported} items; skipped {result.skipped} '
+              f'({"; ".join(result.errors[:3])}).', 'info')
+    else:
+        flash(f'Imported {result.imported} items.', 'success')
+    return redirect(url_for('wardrobe'))
+
+@app.route('/api/wardrobe/import', methods=['POST'])
+@login_required
+def api_import_wardrobe():
+    result, problem = run_import()
+    if problem:
+        return jsonify(error=problem), 400
+    return jsonify(result.to_dict())
+
+@app.route('/wardrobe/export.<fmt>')
+@login_required
+@database.read_replica
+def export_wardrobe(fmt):
+    if fmt not in transfer.FORMATS:
+        return 'Unsupported export format.', 404
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(transfer.export_chunks(current_user.id, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=wardrobe.{fmt}'}
+    )
+
+@app.route('/media/<path:filename>')
+def media(filename):
+    return storage.serve(filename)
+
+# -----------------------------
+# Resumable uploads
+# -----------------------------
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '')
+    if not allowed_file(filename):
+        return jsonify(error='Unsupported image format. Allowed: png, jpg, jpeg, gif, webp.'), 415
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify(error='size must be an integer number of bytes.'), 400
+    try:
+        upload = uploads.create(current_user.id, filename, size, data.get('sha256'))
+        db.session.commit()
+    except uploads.UploadError as exc:
+        db.session.rollback()
+        return jsonify(error=str(exc)), exc.status
+    response = jsonify(dict(uploads.status(upload), chunk_size=app.config['UPLOAD_CHUNK_MAX']))
+    response.status_code = 201
+    response.headers['Location'] = url_for('upload_session', upload_id=upload.id)
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+@login_required
+def upload_session(upload_id):
+    try:
+        upload = uploads.get(current_user.id, upload_id)
+    except uploads.UploadError as exc:
+        return jsonify(error=str(exc)), exc.status
+    try:
+        if request.method == 'DELETE':
+            uploads.discard(upload)
+            db.session.commit()
+            return '', 204
+        if request.method == 'PATCH':
+            try:
+                offset = int(request.headers.get('Upload-Offset', ''))
+            except ValueError:
+                return jsonify(error='Upload-Offset header is required.'), 400
+            uploads.write_chunk(upload, offset, request.stream, request.content_length or 0)
+            db.session.commit()
+    except uploads.UploadError as exc:
+        db.session.commit()  # keep progress a disconnected chunk made before the error
+        if exc.status == 409:
+            return jsonify(error=str(exc), offset=upload.received), 409
+        return jsonify(error=str(exc)), exc.status
+    response = jsonify(uploads.status(upload))
+    response.headers['Upload-Offset'] = str(upload.received)
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """Turn a fully received upload into a new item, or the new photo of `item_id`."""
+    data = request.get_json(silent=True) or request.form
+    item = None
+    if data.get('item_id'):
+        item = WardrobeItem.query.filter_by(id=data.get('item_id'), user_id=current_user.id).first()
+        if not item:
+            return jsonify(error='Item not found or not authorized.'), 404
+    else:
+        name = str(data.get('name') or '').strip()
+        category = str(data.get('category') or '').strip()
+        if not name or not category:
+            return jsonify(error='Name and category are required.'), 400
+
+    try:
+        upload = uploads.get(current_user.id, upload_id)
+        image_hash, image_url = uploads.complete(upload)
+    except uploads.UploadError as exc:
+        db.session.commit()  # a failed check discards the session
+        return jsonify(error=str(exc)), exc.status
+
+    if item is None:
+        item = WardrobeItem(
+            user_id=current_user.id, name=name, category=category,
+            color=str(data.get('color') or '').strip() or None,
+            notes=str(data.get('notes') or '').strip() or None,
+        )
+        db.session.add(item)
+    else:
+        storage.release(item.image_hash)
+        item.thumb_url = item.webp_url = item.image_colors = None
+    item.image_hash, item.image_url, item.image_status = image_hash, image_url, 'pending'
+    try:
+        similar = duplicates.fingerprint_upload(item)
+        cache.invalidate_recommendations(current_user)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify(error='Failed to save the item. Please try again.'), 500
+    images.enqueue(item)
+    return jsonify(item=item.to_dict(), duplicates=[it.id for it in similar]), 201
+
 # -----------------------------
 # Personal Styler (with Occasion)
 # -----------------------------
 @app.route('/personal-styler', methods=['GET', 'POST'])
 @login_required
+@database.read_replica
 def personal_styler():
     profile = UserProfile.query.filter_by(user_id=current_user.id).first()
     if not profile:
+        # transient defaults; the row is only created by the first save
         profile = UserProfile(user_id=current_user.id)
-        db.session.add(profile)
-        db.session.commit()
 
     errors = []
     saved = False
@@ -289,20 +722,23 @@ def personal_styler():
         hair_color = request.form.get('hair_color', '').strip() or None
         occasion = request.form.get('occasion', '').strip() or None
 
-        if undertone and undertone not in ['cool', 'warm', 'neutral']:
-            errors.append('Undertone must be one of cool, warm, neutral.')
+        ruleset = rules.current()
+        if undertone and undertone not in ruleset.undertones:
+            errors.append(f"Undertone must be one of {', '.join(ruleset.undertones)}.")
 
-        allowed_occasions = ['work','casual','party','wedding','festive','sports','custom']
-        if occasion and occasion not in allowed_occasions:
+        if occasion and occasion not in ruleset.occasions:
             errors.append('Occasion is invalid.')
 
         if not errors:
+            if profile.id is None:
+                db.session.add(profile)
             profile.skin_tone = skin_tone
             profile.undertone = undertone
             profile.eye_color = eye_color
             profile.hair_color = hair_color
             profile.occasion = occasion
             try:
+                cache.invalidate_recommendations(current_user)
                 db.session.commit()
                 saved = True
                 flash('Personal Styler preferences saved.', 'success')
@@ -310,173 +746,171 @@ def personal_styler():
                 db.session.rollback()
                 flash('Failed to save preferences.', 'error')
 
-    undertone_map = {
-        'cool': ['jewel tones', 'blue', 'emerald', 'amethyst', 'cool gray', 'crisp white'],
-        'warm': ['earth tones', 'olive', 'mustard', 'rust', 'camel', 'ivory'],
-        'neutral': ['soft pastels', 'taupe', 'peach', 'mauve', 'balanced grays', 'off-white'],
-        None: []
-    }
-
-    occasion_map = {
-        'work': ['navy', 'charcoal', 'white', 'muted blue'],
-        'casual': ['denim', 'olive', 'beige', 'white'],
-        'party': ['metallic', 'deep red', 'emerald', 'black'],
-        'wedding': ['pastel', 'champagne', 'ivory', 'soft pink'],
-        'festive': ['gold', 'maroon', 'royal blue', 'bottle green'],
-        'sports': ['black', 'electric blue', 'neon accents'],
-        'custom': []
-    }
-
-    base_sugs = undertone_map.get(profile.undertone, [])
-    extra_sugs = occasion_map.get(profile.occasion, []) if profile.occasion else []
-    undertone_suggestions = base_sugs + extra_sugs
-
-    palette_map = {
-        'cool': ['#0f52ba', '#50c7f2', '#6a0dad', '#2f4f4f', '#ffffff'],
-        'warm': ['#b5651d', '#c19a6b', '#556b2f', '#8b4513', '#fffff0'],
-        'neutral': ['#e6e0d4', '#d8bfd8', '#f5deb3', '#708090', '#f8f8ff'],
-        None: []
-    }
-    palette = palette_map.get(profile.undertone, [])
-
-    q_items = WardrobeItem.query.filter_by(user_id=current_user.id)
-    items_latest = q_items.order_by(WardrobeItem.created_at.desc()).limit(6).all()
-
-    keywords = {
-        'cool': ['blue', 'navy', 'emerald', 'purple', 'amethyst', 'grey', 'gray', 'white'],
-        'warm': ['brown', 'tan', 'beige', 'mustard', 'olive', 'rust', 'camel', 'ivory'],
-        'neutral': ['taupe', 'peach', 'mauve', 'pastel', 'gray', 'grey', 'off-white']
-    }
-    match_words = keywords.get(profile.undertone, [])[:]
-
-    occ_keywords = {
-        'work': ['blazer','shirt','trouser','formal','office'],
-        'casual': ['tee','t-shirt','jeans','hoodie','sneaker','casual'],
-        'party': ['sequin','dress','bodycon','heels','party'],
-        'wedding': ['sherwani','lehenga','sari','gown','pastel','wedding'],
-        'festive': ['kurta','ethnic','embroidery','gold','festive'],
-        'sports': ['track','jersey','shorts','sweat','sport'],
-        'custom': []
-    }
-    if profile.occasion:
-        match_words += occ_keywords.get(profile.occasion, [])
-
-    picks = []
-    if match_words:
-        like_filters = []
-        for w in match_words:
-            like = f'%{w}%'
-            like_filters.extend([
-                WardrobeItem.color.ilike(like),
-                WardrobeItem.notes.ilike(like),
-                WardrobeItem.category.ilike(like)
-            ])
-        or_expr = or_(*like_filters) if like_filters else None
-        if or_expr is not None:
-            picks = (
-                q_items.filter(or_expr)
-                .order_by(WardrobeItem.created_at.desc())
-                .limit(6).all()
-            )
+    rec = cache.recommendations().get_or_compute(
+        'styler', current_user,
+        lambda: precompute.lookup(current_user.id, 'styler') or styler_recommendations(profile)
+    )
 
     return render_template(
         'personal-styler.html',
         profile=profile,
         saved=saved,
         errors=errors,
-        undertone_suggestions=undertone_suggestions,
-        palette=palette,
-        wardrobe_picks=picks if picks else items_latest
+        undertone_suggestions=rec['suggestions'],
+        palette=rec['palette'],
+        wardrobe_picks=rec['picks'],
+        undertones=rules.current().undertones,
+        occasions=rules.current().occasions
     )
 
+def pick_summary(item) -> dict:
+    """Cache-friendly view of a WardrobeItem for the styler/colour templates."""
+    return {
+        'id': item.id,
+        'name': item.name,
+        'category': item.category,
+        'color': item.color,
+        'color_hex': item.color_hex,
+    }
+
+def styler_recommendations(profile) -> dict:
+    rule = rules.current().styler_rule(profile.undertone, profile.occasion)
+    return {
+        'suggestions': list(rule.suggestions),
+        'palette': list(rule.palette),
+        'picks': [pick_summary(it) for it in styler_picks(profile.user_id, rule.match_words)],
+    }
+
+def styler_picks(user_id: int, match_words, limit: int = 6) -> list:
+    """Latest items matching the keywords, else the latest items, in one SELECT."""
+    def newest(name, *criteria):
+        # a derived table rather than IN (... LIMIT n), which MySQL rejects
+        return (
+            select(WardrobeItem.id)
+            .where(WardrobeItem.user_id == user_id, *criteria)
+            .order_by(WardrobeItem.created_at.desc())
+            .limit(limit)
+            .subquery(name)
+        )
+
+    latest = newest('latest')
+    if not match_words:
+        return db.session.scalars(select(WardrobeItem).join(latest, WardrobeItem.id == latest.c.id)
+                                  .order_by(WardrobeItem.created_at.desc())).all()
+
+    # both candidate sets come back together; the flag tells them apart
+    matched = newest('matched', WardrobeItem.id.in_(tags.items_tagged_any(match_words)))
+    rows = db.session.execute(
+        select(WardrobeItem, matched.c.id.is_not(None).label('is_pick'))
+        .outerjoin(latest, WardrobeItem.id == latest.c.id)
+        .outerjoin(matched, WardrobeItem.id == matched.c.id)
+        .where(or_(latest.c.id.is_not(None), matched.c.id.is_not(None)))
+        .order_by(WardrobeItem.created_at.desc())
+    ).all()
+    picks = [item for item, is_pick in rows if is_pick]
+    return picks or [item for item, _ in rows][:limit]
+
 # -----------------------------
 # Colour Analysis
 # -----------------------------
 @app.route('/colour-analysis')
 @login_required
+@database.read_replica
 def colour_analysis():
     profile = UserProfile.query.filter_by(user_id=current_user.id).first()
+    rec = cached_colour_recommendations(profile)
 
+    return render_template(
+        'colour-analysis.html',
+        profile=profile,
+        season=rec['season'],
+        palette=rec['palette'],
+        wardrobe_hits=rec['hits']
+    )
+
+def colour_inputs(profile) -> tuple:
+    """(undertone, skin tone, eye, hair), lowercased, as colour_recommendations() takes them."""
     undertone = (profile.undertone.lower() if profile and profile.undertone else None)
     skin_tone = (profile.skin_tone.lower() if profile and profile.skin_tone else None)
     eye = (profile.eye_color.lower() if profile and profile.eye_color else None)
     hair = (profile.hair_color.lower() if profile and profile.hair_color else None)
+    return undertone, skin_tone, eye, hair
 
-    def season_from(ut, st, eye_c, hair_c):
-        if not ut:
-            return None
-        cool = (ut == 'cool')
-        warm = (ut == 'warm')
-        neutral = (ut == 'neutral')
-        high_contrast = False
-        if st and hair_c:
-            light_skin = any(k in st for k in ['very fair','fair','light','light-medium'])
-            dark_hair = any(k in hair_c for k in ['black','dark','deep'])
-            high_contrast = light_skin and dark_hair
-        if cool:
-            return 'Winter' if high_contrast else 'Summer'
-        if warm:
-            return 'Spring' if high_contrast else 'Autumn'
-        if neutral:
-            return 'Winter' if high_contrast else 'Autumn'
-        return None
-
-    season = season_from(undertone, skin_tone, eye, hair)
-
-    PALETTES = {
-        'Winter': {
-            'neutrals': ['#000000','#2F4F4F','#FFFFFF','#C0C0C0'],
-            'accents':  ['#0F52BA','#228B22','#800080','#DC143C'],
-            'avoid':    ['#C19A6B','#DAA520','#8B4513']
-        },
-        'Summer': {
-            'neutrals': ['#708090','#D3D3D3','#F8F8FF','#C0C0C0'],
-            'accents':  ['#87CEFA','#6A5ACD','#3CB371','#DB7093'],
-            'avoid':    ['#8B4513','#B5651D','#FF8C00']
-        },
-        'Spring': {
-            'neutrals': ['#FFF8DC','#F5F5DC','#C19A6B','#8B4513'],
-            'accents':  ['#FFD700','#FF8C00','#32CD32','#FF69B4'],
-            'avoid':    ['#808080','#4B0082','#2F4F4F']
-        },
-        'Autumn': {
-            'neutrals': ['#8B4513','#654321','#C19A6B','#F5DEB3'],
-            'accents':  ['#556B2F','#B8860B','#A0522D','#CD5C5C'],
-            'avoid':    ['#FFFFFF','#ADD8E6','#9370DB']
-        }
-    }
-    palette = PALETTES.get(season, None)
-
-    color_keywords = None
-    if season == 'Winter':
-        color_keywords = ['black','white','navy','emerald','crimson','purple','silver','gray','grey']
-    elif season == 'Summer':
-        color_keywords = ['slate','lavender','rose','mint','light blue','gray','grey','soft white']
-    elif season == 'Spring':
-        color_keywords = ['ivory','camel','beige','gold','lime','coral','peach','brown']
-    elif season == 'Autumn':
-        color_keywords = ['olive','mustard','rust','terracotta','tan','brown','warm beige']
+def cached_colour_recommendations(profile) -> dict:
+    return cache.recommendations().get_or_compute(
+        'colour', current_user,
+        lambda: (precompute.lookup(current_user.id, 'colour')
+                 or colour_recommendations(current_user.id, *colour_inputs(profile)))
+    )
+
+def colour_recommendations(user_id, undertone, skin_tone, eye, hair) -> dict:
+    ruleset = rules.current()
+    season = ruleset.season(undertone, skin_tone, hair)
+    palette = ruleset.palette(season)
 
     wardrobe_hits = []
-    if color_keywords:
-        like_filters = [WardrobeItem.color.ilike(f'%{w}%') for w in color_keywords]
-        or_expr = or_(*like_filters) if like_filters else None
-        if or_expr is not None:
-            wardrobe_hits = (
-                WardrobeItem.query.filter_by(user_id=current_user.id)
-                .filter(WardrobeItem.color.isnot(None))
-                .filter(or_expr)
-                .order_by(WardrobeItem.created_at.desc())
-                .limit(8).all()
-            )
+    if palette:
+        ids, labs = colors.user_color_matrix(user_id)
+        hit_ids = colors.rank_by_palette(
+            ids, labs, palette['neutrals'] + palette['accents'], palette['avoid'], limit=8
+        )
+        if hit_ids:
+            by_id = {it.id: it for it in WardrobeItem.query.filter(WardrobeItem.id.in_(hit_ids))}
+            wardrobe_hits = [pick_summary(by_id[i]) for i in hit_ids]
 
-    return render_template(
-        'colour-analysis.html',
-        profile=profile,
-        season=season,
-        palette=palette,
-        wardrobe_hits=wardrobe_hits
+    return {'season': season, 'palette': palette, 'hits': wardrobe_hits}
+
+# -----------------------------
+# Outfits
+# -----------------------------
+MAX_OUTFITS = 20
+
+@app.route('/api/styler/outfits')
+@login_required
+@database.read_replica
+def api_outfits():
+    try:
+        limit = int(request.args.get('limit', 5))
+    except ValueError:
+        return jsonify(error='limit must be an integer.'), 400
+    limit = max(1, min(limit, MAX_OUTFITS))
+
+    rec = cache.recommendations().get_or_compute('outfits', current_user, lambda: outfit_recommendations())
+    return jsonify(outfits=rec['outfits'][:limit], season=rec['season'], truncated=rec['truncated'])
+
+def outfit_recommendations() -> dict:
+    """Top outfits for current_user, scored against their season palette and occasion."""
+    profile = UserProfile.query.filter_by(user_id=current_user.id).first()
+    palette = cached_colour_recommendations(profile)
+    good = avoid = ()
+    if palette['palette']:
+        good = tuple(palette['palette']['neutrals'] + palette['palette']['accents'])
+        avoid = tuple(palette['palette']['avoid'])
+    occasion_words = rules.current().occasion_keywords.get(profile.occasion, ()) if profile and profile.occasion else ()
+
+    features = outfits.load_features(current_user.id, good, avoid, occasion_words)
+    result = outfits.build_outfits(
+        features, limit=MAX_OUTFITS,
+        beam_width=app.config['OUTFIT_BEAM_WIDTH'],
+        per_slot=app.config['OUTFIT_CANDIDATES_PER_SLOT'],
+        budget_ms=app.config['OUTFIT_BUDGET_MS'],
     )
+    ids = {i for o in result['outfits'] for i in o['item_ids']}
+    by_id = {it.id: pick_summary(it) for it in WardrobeItem.query.filter(WardrobeItem.id.in_(ids))} if ids else {}
+    return {
+        'season': palette['season'],
+        'truncated': result['truncated'],
+        'outfits': [
+            {'score': o['score'], 'items': [by_id[i] for i in o['item_ids']]}
+            for o in result['outfits']
+        ],
+    }
+
+@app.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    return jsonify(recommendations=cache.recommendations().stats(), fragments=cache.fragments().stats(),
+                   users=cache.users().stats())
 
 # -----------------------------
 # Error Handlers
@@ -495,4 +929,7 @@ def internal_error(error):
 # -----------------------------
 if __name__ == '__main__':
     print('Starting GlamDiva...')
+    with app.app_context():
+        migrations.upgrade(print)
+        ensure_demo_user()  # DEV-ONLY: remove before production
     app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
@@ -0,0 +1,170 @@
+"""
+Bulk wardrobe edits
+Delete, recategorize or recolor many of one user's items in one transaction.
+Each action is a single UPDATE/DELETE scoped to the user, which means the ORM
+flush hooks that normally keep derived state in step never fire: the search
+index, keyword tags, canonical colors, facet counts, photo fingerprints and
+blob references are all maintained here instead, set-based as well
+"""
+
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from models import db, ImageFingerprint, WardrobeItem, wardrobe_item_tags
+import cache
+import colors
+import facets
+import search
+import storage
+import tags
+
+ACTIONS = ('delete', 'recategorize', 'recolor')
+
+
+class BulkError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class BulkResult(NamedTuple):
+    action: str
+    updated: int      # items the action applied to
+    missing: list     # requested ids that aren't this user's (or no longer exist)
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class _Item(NamedTuple):
+    id: int
+    user_id: int
+    name: str
+    notes: Optional[str]
+    color: Optional[str]
+    category: str
+    color_family: Optional[str]
+    image_url: Optional[str]
+    image_hash: Optional[str]
+
+    def facet_values(self) -> tuple:
+        return facets.item_values(self.category, self.color_family, self.image_url)
+
+
+def parse_ids(values) -> list:
+    if not isinstance(values, (list, tuple)):
+        raise BulkError('ids must be a list of item ids.')
+    try:
+        ids = {int(v) for v in values}
+    except (TypeError, ValueError):
+        raise BulkError('ids must be a list of item ids.')
+    if not ids:
+        raise BulkError('Select at least one item.')
+    limit = current_app.config['WARDROBE_BULK_MAX']
+    if len(ids) > limit:
+        raise BulkError(f'At most {limit} items can be changed at once.', 413)
+    return sorted(ids)
+
+
+def _owned(user_id: int, ids) -> list:
+    rows = db.session.execute(
+        select(*(getattr(WardrobeItem, f) for f in _Item._fields))
+        .where(WardrobeItem.user_id == user_id, WardrobeItem.id.in_(ids))
+    ).all()
+    return [_Item(*row) for row in rows]
+
+
+def _result(action: str, ids, found) -> BulkResult:
+    found = set(found)
+    return BulkResult(action, len(found), [i for i in ids if i not in found])
+
+
+# -----------------------------
+# Actions (the caller commits)
+# -----------------------------
+def delete_items(user, ids) -> BulkResult:
+    items = _owned(user.id, ids)
+    found = [it.id for it in items]
+    if not found:
+        return _result('delete', ids, found)
+    conn = db.session.connection()
+    facets.apply_deltas(conn, facets.change_deltas(user.id, [it.facet_values() for it in items]))
+    storage.release_many(Counter(it.image_hash for it in items if it.image_hash))
+    search.get_backend().remove_many(conn, found)
+    db.session.execute(delete(wardrobe_item_tags).where(wardrobe_item_tags.c.item_id.in_(found)))
+    db.session.execute(delete(ImageFingerprint).where(ImageFingerprint.item_id.in_(found)))
+    db.session.execute(
+        delete(WardrobeItem).where(WardrobeItem.user_id == user.id, WardrobeItem.id.in_(found))
+        .execution_options(synchronize_session=False)
+    )
+    cache.invalidate_recommendations(user)
+    return _result('delete', ids, found)
+
+
+def _update(user, items, values: dict) -> None:
+    """One UPDATE of `values` over `items`, then every index that depends on those columns."""
+    ids = [it.id for it in items]
+    db.session.execute(
+        update(WardrobeItem).where(WardrobeItem.user_id == user.id, WardrobeItem.id.in_(ids))
+        .values(**values).execution_options(synchronize_session=False)
+    )
+    after = [it._replace(**{k: v for k, v in values.items() if k in _Item._fields}) for it in items]
+    conn = db.session.connection()
+    facets.apply_deltas(conn, facets.change_deltas(
+        user.id, [it.facet_values() for it in items], [it.facet_values() for it in after]
+    ))
+    tags.retag_rows(db.session, after)
+    search.get_backend().index_many(conn, after)
+    cache.invalidate_recommendations(user)
+
+
+def recategorize(user, ids, category) -> BulkResult:
+    category = str(category or '').strip()
+    if not category:
+        raise BulkError('Choose a category.')
+    if len(category) > 80:
+        raise BulkError('Category is too long.')
+    items = _owned(user.id, ids)
+    changed = [it for it in items if it.category != category]
+    if changed:
+        _update(user, changed, {'category': category})
+    return _result('recategorize', ids, [it.id for it in items])
+
+
+def recolor(user, ids, color) -> BulkResult:
+    """Set (or with an empty color, clear) the typed color; photo-detected colors stop applying."""
+    color = str(color or '').strip() or None
+    if color and len(color) > 60:
+        raise BulkError('Color is too long.')
+    items = _owned(user.id, ids)
+    if items:
+        # every item gets the same text, so it is parsed once for the whole batch
+        values = {'color': color, 'color_detected': False, **colors.canonical_values(colors.parse_color(color))}
+        _update(user, items, values)
+    return _result('recolor', ids, [it.id for it in items])
+
+
+def apply(user, action: str, ids, category=None, color=None) -> BulkResult:
+    if action not in ACTIONS:
+        raise BulkError(f"action must be one of {', '.join(ACTIONS)}.")
+    ids = parse_ids(ids)
+    if action == 'delete':
+        return delete_items(user, ids)
+    if action == 'recategorize':
+        return recategorize(user, ids, category)
+    return recolor(user, ids, color)
+
+
+def summary(result: BulkResult, category=None) -> str:
+    noun = 'item' if result.updated == 1 else 'items'
+    message = {
+        'delete': f'Deleted {result.updated} {noun}.',
+        'recategorize': f'Moved {result.updated} {noun} to {category}.',
+        'recolor': f'Recolored {result.updated} {noun}.',
+    }[result.action]
+    if result.missing:
+        message += f' {len(result.missing)} could not be found.'
+    return message
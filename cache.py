@@ -0,0 +1,270 @@
+"""
+Small caching layer
+In-process LRU with TTL by default, Redis when CACHE_BACKEND='redis';
+RecommendationCache keys styler/colour results by user and data version;
+FragmentCache holds rendered page fragments; UserCache serves the session
+user without a SELECT per request
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from models import db, User
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class LRUCache:
+    """Thread-safe, size-bounded LRU; entries also expire `ttl` seconds after they are set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """Shared backend for multi-process deployments; values must be JSON-serializable."""
+
+    def __init__(self, url: str, ttl: float = 300.0, prefix: str = 'glamdiva:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float = None) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, *keys) -> None:
+        if keys:
+            self.client.delete(*(self.prefix + k for k in keys))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def make_backend(config, maxsize: int, ttl: float):
+    if config.get('CACHE_BACKEND') == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], ttl=ttl)
+    return LRUCache(maxsize=maxsize, ttl=ttl)
+
+
+# -----------------------------
+# Recommendations
+# -----------------------------
+class RecommendationCache:
+    """Per-user results keyed by (view, user id, user.data_version, key_suffix()).
+
+    Writes bump User.data_version in their own transaction, so a stale entry
+    can never be read again in any process; the old keys simply age out.
+    """
+
+    VIEWS = ('styler', 'colour', 'outfits')
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.key_suffix = lambda: ''  # e.g. the styling rules fingerprint, set by rules.init_app
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, view: str, user) -> str:
+        return f'rec:{view}:{user.id}:{user.data_version or 0}:{self.key_suffix()}'
+
+    def get_or_compute(self, view: str, user, compute):
+        key = self.key(view, user)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def recommendations() -> RecommendationCache:
+    return current_app.extensions['recommendation_cache']
+
+
+def invalidate_recommendations(user) -> None:
+    """Call before committing any write that changes `user`'s profile or wardrobe."""
+    if inspect(user).attrs.data_version.history.has_changes():
+        return  # already bumped in this transaction
+    cache = recommendations()
+    cache.backend.delete(*(cache.key(view, user) for view in RecommendationCache.VIEWS))
+    user.data_version = func.coalesce(User.data_version, 0) + 1
+
+
+# -----------------------------
+# Rendered fragments
+# -----------------------------
+class FragmentCache:
+    """Rendered template fragments; callers put the owner's data_version in the key."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: str, compute):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def fragments() -> FragmentCache:
+    return current_app.extensions['fragment_cache']
+
+
+# -----------------------------
+# Session user
+# -----------------------------
+class UserCache:
+    """Column snapshots of recently seen users for Flask-Login's user_loader.
+
+    Always in-process (snapshots include the password hash, which must not
+    leave the worker). Rows updated through the ORM are evicted once their
+    transaction commits; other processes see changes within `ttl` seconds.
+    data_version and updated_at are left out and load on first access, so
+    cache keys and ETags built from them always see other workers' writes.
+    """
+
+    FRESH_COLUMNS = ('data_version', 'updated_at')
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.backend = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in inspect(User).column_attrs if attr.key not in self.FRESH_COLUMNS]
+
+    def load(self, user_id: int):
+        snapshot = self.backend.get(user_id)
+        if snapshot is None:
+            with self._lock:
+                self.misses += 1
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.backend.set(user_id, {key: getattr(user, key) for key in self._columns})
+            return user
+        with self._lock:
+            self.hits += 1
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        # attach as a persistent instance without emitting a SELECT; the
+        # FRESH_COLUMNS stay expired and are selected only if something reads them
+        return db.session.merge(user, load=False)
+
+    def forget(self, *user_ids) -> None:
+        self.backend.delete(*user_ids)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'db_hits_avoided': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'size': len(self.backend),
+        }
+
+
+def users() -> UserCache:
+    return current_app.extensions['user_cache']
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_user_stale(mapper, connection, target):
+    object_session(target).info.setdefault('stale_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_stale_users(session):
+    stale = session.info.pop('stale_users', None)
+    if stale and has_app_context() and 'user_cache' in current_app.extensions:
+        users().forget(*stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stale_users(session):
+    session.info.pop('stale_users', None)
+
+
+def init_app(app) -> None:
+    backend = make_backend(app.config, app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'])
+    app.extensions['recommendation_cache'] = RecommendationCache(backend)
+    app.extensions['fragment_cache'] = FragmentCache(
+        make_backend(app.config, app.config['FRAGMENT_CACHE_MAX_ENTRIES'], app.config['FRAGMENT_CACHE_TTL'])
+    )
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_MAX_ENTRIES'], app.config['USER_CACHE_TTL'])
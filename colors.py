@@ -0,0 +1,414 @@
+"""
+Canonical color model for wardrobe items
+Free-text colors are parsed once at write time into sRGB hex + CIELAB columns;
+palette matching then scores a whole wardrobe with one NumPy delta-E pass.
+Photos are sampled with k-means for dominant colors, which fill a blank color
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import click
+import numpy as np
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from models import db, WardrobeItem
+
+RGB = Tuple[int, int, int]
+
+# Keys are lowercase with spaces/hyphens removed so 'Navy Blue', 'navy-blue'
+# and 'navyblue' all resolve to the same entry.
+NAMED_COLORS = {
+    # neutrals
+    'black': '#000000', 'jetblack': '#0a0a0a', 'onyx': '#353839', 'charcoal': '#36454f',
+    'graphite': '#383838', 'slate': '#708090', 'gray': '#808080', 'grey': '#808080',
+    'silver': '#c0c0c0', 'ash': '#b2beb5', 'white': '#ffffff', 'offwhite': '#f8f8f0',
+    'softwhite': '#f8f8ff', 'crispwhite': '#fdfdfd', 'ivory': '#fffff0', 'cream': '#fffdd0',
+    'eggshell': '#f0ead6', 'ecru': '#c2b280', 'beige': '#f5f5dc', 'warmbeige': '#e8cfa6',
+    'nude': '#e3bc9a', 'sand': '#c2b280', 'stone': '#ada587', 'taupe': '#8b8589',
+    'khaki': '#c3b091', 'tan': '#d2b48c', 'camel': '#c19a6b', 'oatmeal': '#d8c9b0',
+    'mushroom': '#bdaca3', 'champagne': '#f7e7ce',
+    # browns
+    'brown': '#8b4513', 'chocolate': '#7b3f00', 'coffee': '#6f4e37', 'mocha': '#967969',
+    'espresso': '#3c2218', 'cognac': '#9a463d', 'chestnut': '#954535', 'walnut': '#5d432c',
+    'rust': '#b7410e', 'terracotta': '#e2725b', 'copper': '#b87333', 'bronze': '#cd7f32',
+    'cinnamon': '#d2691e', 'sienna': '#a0522d', 'umber': '#635147', 'darkbrown': '#654321',
+    # reds / pinks
+    'red': '#ff0000', 'deepred': '#8b0000', 'crimson': '#dc143c', 'scarlet': '#ff2400',
+    'cherry': '#d2042d', 'ruby': '#9b111e', 'wine': '#722f37', 'burgundy': '#800020',
+    'maroon': '#800000', 'oxblood': '#4a0000', 'brick': '#cb4154', 'pink': '#ffc0cb',
+    'softpink': '#f4c2c2', 'blush': '#de5d83', 'rose': '#ff007f', 'dustyrose': '#c9a9a6',
+    'hotpink': '#ff69b4', 'fuchsia': '#ff00ff', 'magenta': '#ff00ff', 'raspberry': '#e30b5c',
+    'salmon': '#fa8072', 'coral': '#ff7f50', 'peach': '#ffe5b4', 'apricot': '#fbceb1',
+    # oranges / yellows
+    'orange': '#ffa500', 'burntorange': '#cc5500', 'tangerine': '#f28500', 'amber': '#ffbf00',
+    'yellow': '#ffff00', 'lemon': '#fff700', 'butter': '#fffd74', 'mustard': '#ffdb58',
+    'gold': '#ffd700', 'ochre': '#cc7722', 'saffron': '#f4c430', 'honey': '#eba937',
+    # greens
+    'green': '#008000', 'darkgreen': '#006400', 'forest': '#228b22', 'forestgreen': '#228b22',
+    'bottlegreen': '#006a4e', 'emerald': '#50c878', 'jade': '#00a86b', 'kelly': '#4cbb17',
+    'lime': '#32cd32', 'mint': '#98ff98', 'sage': '#9caf88', 'olive': '#808000',
+    'khakigreen': '#8a865d', 'army': '#4b5320', 'moss': '#8a9a5b', 'pistachio': '#93c572',
+    'seafoam': '#93e9be', 'teal': '#008080', 'hunter': '#355e3b',
+    # blues
+    'blue': '#0000ff', 'navy': '#000080', 'navyblue': '#000080', 'midnight': '#191970',
+    'midnightblue': '#191970', 'royalblue': '#4169e1', 'cobalt': '#0047ab', 'sapphire': '#0f52ba',
+    'electricblue': '#7df9ff', 'skyblue': '#87ceeb', 'lightblue': '#add8e6', 'babyblue': '#89cff0',
+    'powderblue': '#b0e0e6', 'mutedblue': '#6c8ebf', 'steelblue': '#4682b4', 'denim': '#1560bd',
+    'indigo': '#4b0082', 'azure': '#007fff', 'cerulean': '#007ba7', 'turquoise': '#40e0d0',
+    'aqua': '#00ffff', 'cyan': '#00ffff', 'petrol': '#005f6a', 'ink': '#1b2a4a',
+    # purples
+    'purple': '#800080', 'violet': '#8f00ff', 'plum': '#8e4585', 'amethyst': '#9966cc',
+    'lavender': '#b57edc', 'lilac': '#c8a2c8', 'mauve': '#e0b0ff', 'orchid': '#da70d6',
+    'eggplant': '#614051', 'aubergine': '#3b0910', 'grape': '#6f2da8',
+}
+
+# Lab-space adjustments: (delta L*, chroma factor)
+MODIFIERS = {
+    'light': (15.0, 0.85), 'pale': (20.0, 0.6), 'pastel': (20.0, 0.55), 'baby': (15.0, 0.7),
+    'dark': (-15.0, 1.0), 'deep': (-15.0, 1.05), 'rich': (-8.0, 1.1),
+    'bright': (5.0, 1.25), 'vivid': (0.0, 1.3), 'neon': (8.0, 1.4), 'electric': (5.0, 1.3),
+    'soft': (8.0, 0.7), 'muted': (0.0, 0.6), 'dusty': (0.0, 0.55), 'washed': (10.0, 0.6),
+    'faded': (10.0, 0.55),
+}
+
+_HEX_RE = re.compile(r'#([0-9a-f]{6}|[0-9a-f]{3})\b')
+_RGB_RE = re.compile(r'rgb\s*\(\s*(\d{1,3})\s*,\s*(\d{1,3})\s*,\s*(\d{1,3})\s*\)')
+_WORD_RE = re.compile(r'[a-z]+')
+_MAX_NGRAM = 3
+
+
+# -----------------------------
+# Conversions (vectorized over the last axis)
+# -----------------------------
+_M_RGB_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_M_XYZ_RGB = np.linalg.inv(_M_RGB_XYZ)
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+
+def rgb_to_lab(rgb) -> np.ndarray:
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    lin = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = lin @ _M_RGB_XYZ.T / _WHITE_D65
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def lab_to_rgb(lab) -> np.ndarray:
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _WHITE_D65
+    lin = np.clip(xyz @ _M_XYZ_RGB.T, 0.0, 1.0)
+    c = np.where(lin > 0.0031308, 1.055 * lin ** (1 / 2.4) - 0.055, lin * 12.92)
+    return np.rint(c * 255).astype(int)
+
+
+def hex_to_rgb(h: str) -> RGB:
+    h = h.lstrip('#')
+    if len(h) == 3:
+        h = ''.join(ch * 2 for ch in h)
+    return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+
+
+def rgb_to_hex(rgb) -> str:
+    return '#{:02x}{:02x}{:02x}'.format(*(int(v) for v in rgb))
+
+
+def delta_e(a, b) -> np.ndarray:
+    """CIE76 delta-E between every row of `a` (N×3) and every row of `b` (M×3) -> N×M."""
+    a = np.asarray(a, dtype=np.float64)[:, None, :]
+    b = np.asarray(b, dtype=np.float64)[None, :, :]
+    return np.sqrt(((a - b) ** 2).sum(axis=-1))
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def _find_named(words):
+    # Leftmost, longest phrase wins: 'navy blue and white' -> navyblue
+    for start in range(len(words)):
+        for n in range(min(_MAX_NGRAM, len(words) - start), 0, -1):
+            key = ''.join(words[start:start + n])
+            if key in NAMED_COLORS:
+                return start, NAMED_COLORS[key]
+    return None, None
+
+
+def parse_color(text_value: Optional[str]) -> Optional[RGB]:
+    """Best-effort canonical sRGB for free text such as 'Navy Blue', 'midnight' or '#1b2a4a'."""
+    if not text_value:
+        return None
+    t = text_value.strip().lower()
+
+    m = _RGB_RE.search(t)
+    if m:
+        return tuple(min(int(v), 255) for v in m.groups())
+    m = _HEX_RE.search(t)
+    if m:
+        return hex_to_rgb(m.group(1))
+
+    words = _WORD_RE.findall(t.replace('-', ' '))
+    start, hex_value = _find_named(words)
+    if hex_value is None:
+        return None
+    rgb = hex_to_rgb(hex_value)
+
+    mods = [MODIFIERS[w] for w in words[:start] if w in MODIFIERS]
+    if not mods:
+        return rgb
+    lab = rgb_to_lab(rgb)
+    for dl, chroma in mods:
+        lab = np.array([np.clip(lab[0] + dl, 3, 97), lab[1] * chroma, lab[2] * chroma])
+    return tuple(int(v) for v in lab_to_rgb(lab))
+
+
+COLOR_FAMILIES = ('black', 'white', 'grey', 'beige', 'brown', 'red', 'pink', 'orange', 'yellow',
+                  'green', 'blue', 'purple')
+
+
+def color_family(lab) -> str:
+    """Coarse family of a CIELAB color, for filtering ('navy' -> 'blue', 'camel' -> 'brown')."""
+    light, a, b = (float(v) for v in lab)
+    chroma = np.hypot(a, b)
+    hue = np.degrees(np.arctan2(b, a)) % 360
+    if chroma < 12:
+        return 'black' if light < 30 else 'white' if light > 85 else 'grey'
+    if 60 <= hue < 115 and chroma < 35 and light >= 70:
+        return 'beige'
+    if 45 <= hue < 85 and (light < 60 or chroma < 35):
+        return 'brown'
+    if (hue >= 340 or hue < 30) and light >= 60:
+        return 'pink'
+    if hue < 45 or hue >= 345:
+        return 'red'
+    if hue < 85:
+        return 'orange'
+    if hue < 115:
+        return 'yellow' if light >= 60 else 'green'
+    if hue < 200:
+        return 'green'
+    if hue < 310:
+        return 'blue'
+    return 'purple'
+
+
+def canonical_values(rgb) -> dict:
+    """The canonical color columns for an sRGB triple (all None for an unknown color)."""
+    if rgb is None:
+        return dict.fromkeys(('color_hex', 'color_l', 'color_a', 'color_b', 'color_family'))
+    lab = rgb_to_lab(rgb)
+    l, a, b = (float(round(v, 3)) for v in lab)
+    return {'color_hex': rgb_to_hex(rgb), 'color_l': l, 'color_a': a, 'color_b': b,
+            'color_family': color_family(lab)}
+
+
+def apply_canonical(item) -> None:
+    rgb = parse_color(item.color)
+    if item.color_detected and item.image_colors:
+        rgb = hex_to_rgb(item.image_colors.split(',')[0])  # the measured color, not its name
+    for column, value in canonical_values(rgb).items():
+        setattr(item, column, value)
+
+
+@event.listens_for(Session, 'before_flush')
+def _canonicalize_before_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, WardrobeItem):
+            continue
+        state = inspect(obj)
+        if state.pending or state.attrs.color.history.has_changes():
+            apply_canonical(obj)
+
+
+# -----------------------------
+# Palette scoring
+# -----------------------------
+@lru_cache(maxsize=64)
+def palette_lab(hexes: tuple) -> np.ndarray:
+    return rgb_to_lab(np.array([hex_to_rgb(h) for h in hexes])) if hexes else np.empty((0, 3))
+
+
+def rank_by_palette(ids, labs, good_hexes, avoid_hexes=(), max_delta: float = 40.0, limit: int = 8) -> list:
+    """Ids of items whose color is within `max_delta` of a recommended color and
+    closer to it than to any color to avoid, best match first."""
+    if not len(ids) or not good_hexes:
+        return []
+    labs = np.asarray(labs, dtype=np.float64)
+    best = delta_e(labs, palette_lab(tuple(good_hexes))).min(axis=1)
+    ok = best <= max_delta
+    if avoid_hexes:
+        ok &= best < delta_e(labs, palette_lab(tuple(avoid_hexes))).min(axis=1)
+    idx = np.flatnonzero(ok)
+    idx = idx[np.argsort(best[idx], kind='stable')][:limit]
+    return [ids[i] for i in idx]
+
+
+def user_color_matrix(user_id: int):
+    """(ids, N×3 Lab array) for every item of the user with a canonical color."""
+    rows = db.session.execute(
+        select(WardrobeItem.id, WardrobeItem.color_l, WardrobeItem.color_a, WardrobeItem.color_b)
+        .where(WardrobeItem.user_id == user_id, WardrobeItem.color_l.isnot(None))
+        .order_by(WardrobeItem.created_at.desc())
+    ).all()
+    if not rows:
+        return [], np.empty((0, 3))
+    arr = np.array([r[1:] for r in rows], dtype=np.float64)
+    return [r[0] for r in rows], arr
+
+
+# -----------------------------
+# Photo colors
+# -----------------------------
+BACKDROP_FRAME_SHARE = 0.6    # a backdrop fills most of the outer frame...
+BACKDROP_CONTRAST = 1.5       # ...and is far denser there than in the middle
+MIN_SWATCH_SHARE = 0.05
+SAME_COLOR_DELTA = 12.0       # clusters closer than this (delta-E) are reported as one
+MAX_SWATCHES = 8              # fits WardrobeItem.image_colors
+
+
+def kmeans(points: np.ndarray, k: int, iterations: int = 12, seed: int = 0):
+    """Lloyd's k-means with k-means++ seeding over N×3 points -> (centers, labels).
+
+    Each step is one N×k distance matrix; seeded so a photo always yields the same colors.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    centers = [points[rng.integers(n)]]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    while len(centers) < min(k, n) and d2.sum() > 0:
+        centers.append(points[rng.choice(n, p=d2 / d2.sum())])
+        d2 = np.minimum(d2, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = delta_e(points, centers).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=points[:, d], minlength=len(centers))
+                         for d in range(3)], axis=1)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        converged = np.abs(moved - centers).max() < 0.5
+        centers = moved
+        if converged:
+            break
+    return centers, delta_e(points, centers).argmin(axis=1)
+
+
+def dominant_colors(rgba: np.ndarray, k: int = 5) -> list:
+    """[(hex, share)] of a downsampled H×W×4 uint8 image, largest first.
+
+    Transparent pixels are ignored, and a uniform backdrop framing the garment
+    is dropped unless it is the only color there is.
+    """
+    h, w = rgba.shape[:2]
+    band = max(1, round(min(h, w) * 0.1))
+    frame = np.zeros((h, w), dtype=bool)
+    frame[:band] = frame[-band:] = True
+    frame[:, :band] = frame[:, -band:] = True
+
+    opaque = rgba[..., 3] >= 128
+    if not opaque.any():
+        return []
+    centers, labels = kmeans(rgb_to_lab(rgba[..., :3][opaque]), k)
+    counts = np.bincount(labels, minlength=len(centers)).astype(float)
+    on_frame = np.bincount(labels, weights=frame[opaque], minlength=len(centers))
+
+    # a close-up of the fabric fills frame and middle alike, so it is never mistaken for one
+    frame_px = frame[opaque].sum()
+    frame_density = on_frame / max(frame_px, 1)
+    middle_density = (counts - on_frame) / max(opaque.sum() - frame_px, 1)
+    backdrop = (frame_density >= BACKDROP_FRAME_SHARE) & (frame_density >= BACKDROP_CONTRAST * middle_density)
+    if (counts * ~backdrop).any():
+        counts[backdrop] = 0
+    share = counts / counts.sum()
+
+    # k is an upper bound: clusters that split one color (shading, resize blur) fold into the larger
+    swatches = []  # [center index, share]
+    close = delta_e(centers, centers) < SAME_COLOR_DELTA
+    for i in np.argsort(-share, kind='stable'):
+        if not share[i]:
+            break
+        same = next((s for s in swatches if close[i, s[0]]), None)
+        if same:
+            same[1] += share[i]
+        else:
+            swatches.append([i, share[i]])
+    swatches.sort(key=lambda s: -s[1])
+    return [(rgb_to_hex(lab_to_rgb(centers[i])), round(float(sh), 3))
+            for i, sh in swatches if sh >= MIN_SWATCH_SHARE][:MAX_SWATCHES]
+
+
+@lru_cache(maxsize=1)
+def _simple_names():
+    # single names only: 'navyblue', 'offwhite' and 'deepred' end in another named color
+    names = [key for key in NAMED_COLORS
+             if not any(key[i:] in NAMED_COLORS for i in range(3, len(key) - 2))]
+    return names, palette_lab(tuple(NAMED_COLORS[key] for key in names))
+
+
+def color_name(hex_value: str) -> str:
+    """Nearest plain color name for display, e.g. '#1d2f6b' -> 'Navy'."""
+    names, labs = _simple_names()
+    i = int(delta_e(rgb_to_lab(hex_to_rgb(hex_value))[None, :], labs).argmin())
+    return names[i].capitalize()
+
+
+def apply_detected(item, swatches, autofill: bool = True) -> bool:
+    """Store photo swatches on `item`; fill its color if it is blank or was itself detected.
+
+    Returns True when the item's color changed.
+    """
+    item.image_colors = ','.join(hex_value for hex_value, _ in swatches)
+    if not (autofill and swatches and (not item.color or item.color_detected)):
+        return False
+    before = (item.color, item.color_hex)
+    item.color = color_name(swatches[0][0])
+    item.color_detected = True
+    apply_canonical(item)
+    return (item.color, item.color_hex) != before
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill(batch_size: int = 500, only_missing: bool = True) -> int:
+    count = 0
+    last_id = 0
+    while True:
+        stmt = select(WardrobeItem).where(WardrobeItem.id > last_id).order_by(WardrobeItem.id).limit(batch_size)
+        if only_missing:
+            stmt = stmt.where(WardrobeItem.color.isnot(None), or_(
+                WardrobeItem.color_hex.is_(None), WardrobeItem.color_family.is_(None)
+            ))
+        batch = db.session.execute(stmt).scalars().all()
+        if not batch:
+            break
+        for item in batch:
+            apply_canonical(item)
+        count += sum(1 for item in batch if item.color_hex)
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+    return count
+
+
+def init_app(app) -> None:
+    app.add_template_filter(color_name, 'color_name')
+
+    @app.cli.command('colors-backfill')
+    @click.option('--all', 'rebuild_all', is_flag=True, help='Re-parse every item, not only unparsed ones.')
+    @click.option('--batch-size', default=500, show_default=True)
+    def colors_backfill_command(rebuild_all, batch_size):
+        """Parse free-text wardrobe colors into canonical RGB/CIELAB values."""
+        n = backfill(batch_size, only_missing=not rebuild_all)
+        click.echo(f'Canonicalized {n} wardrobe colors.')
@@ -3,7 +3,89 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///styler_app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for GET-heavy routes (see database.read_replica)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)
+    # SQLite: WAL lets readers proceed during writes; busy_timeout waits out short write locks
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    # Connection pool for server databases (PostgreSQL/MySQL); ignored for SQLite
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    # Wardrobe full-text search: 'auto' (FTS5 on SQLite, LIKE elsewhere), 'fts5' or 'like'
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    # Uploaded originals and their WebP variants (created on first upload)
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(BASE_DIR, 'static', 'uploads')
+    MAX_CONTENT_LENGTH = 8 * 1024 * 1024  # 8MB
+    # Resumable uploads (/api/uploads): whole-file cap, per-request chunk cap (kept under
+    # MAX_CONTENT_LENGTH), idle time before a session is garbage-collected, open sessions per user
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 40 * 1024 * 1024)
+    UPLOAD_CHUNK_MAX = int(os.environ.get('UPLOAD_CHUNK_MAX') or 4 * 1024 * 1024)
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)
+    UPLOAD_SESSIONS_PER_USER = int(os.environ.get('UPLOAD_SESSIONS_PER_USER') or 5)
+    # Items per page on /wardrobe and default page size for /api/wardrobe
+    WARDROBE_PAGE_SIZE = int(os.environ.get('WARDROBE_PAGE_SIZE') or 50)
+    # Relevance-sorted search pages are served from an ordered snapshot kept this long (seconds)
+    WARDROBE_SEARCH_SNAPSHOT_TTL = int(os.environ.get('WARDROBE_SEARCH_SNAPSHOT_TTL') or 1800)
+    # /wardrobe?all=1 streams every item: rows fetched per batch, HTML flushed every N characters
+    WARDROBE_STREAM_BATCH = int(os.environ.get('WARDROBE_STREAM_BATCH') or 500)
+    WARDROBE_STREAM_FLUSH = int(os.environ.get('WARDROBE_STREAM_FLUSH') or 16384)
+    # Most items one /wardrobe/bulk or /api/wardrobe/bulk request may delete, recategorize or recolor
+    WARDROBE_BULK_MAX = int(os.environ.get('WARDROBE_BULK_MAX') or 500)
+    # Upload post-processing: 'thread' runs in a bounded background pool, 'inline' in the request
+    IMAGE_PROCESSING = os.environ.get('IMAGE_PROCESSING') or 'thread'
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_QUEUE_MAX = int(os.environ.get('IMAGE_QUEUE_MAX') or 64)
+    IMAGE_THUMB_SIZE = 256
+    IMAGE_WEBP_MAX_SIZE = 1280
+    IMAGE_WEBP_QUALITY = 80
+    # Dominant photo colors: k-means clusters over a copy at most IMAGE_COLOR_SAMPLE px on a side;
+    # with autofill on, an item with no typed color takes the largest one
+    IMAGE_COLOR_CLUSTERS = int(os.environ.get('IMAGE_COLOR_CLUSTERS') or 5)
+    IMAGE_COLOR_SAMPLE = int(os.environ.get('IMAGE_COLOR_SAMPLE') or 64)
+    IMAGE_COLOR_AUTOFILL = (os.environ.get('IMAGE_COLOR_AUTOFILL') or '1') != '0'
+    # Uploads within this many bits (of 64) of an existing photo's perceptual hash are flagged as duplicates
+    IMAGE_DUPLICATE_DISTANCE = int(os.environ.get('IMAGE_DUPLICATE_DISTANCE') or 10)
+    # Outfit builder (/api/styler/outfits): beam width, items kept per category, search time budget
+    OUTFIT_BEAM_WIDTH = int(os.environ.get('OUTFIT_BEAM_WIDTH') or 8)
+    OUTFIT_CANDIDATES_PER_SLOT = int(os.environ.get('OUTFIT_CANDIDATES_PER_SLOT') or 25)
+    OUTFIT_BUDGET_MS = float(os.environ.get('OUTFIT_BUDGET_MS') or 150)
+    # Styler/colour-analysis rules; the file is re-read when it changes, checked at most every N seconds (0 = never)
+    STYLING_RULES_PATH = os.environ.get('STYLING_RULES_PATH') or os.path.join(BASE_DIR, 'styling_rules.json')
+    STYLING_RULES_RELOAD = float(os.environ.get('STYLING_RULES_RELOAD') or 5)
+    # Recommendation cache: 'memory' (per-process LRU) or 'redis' (shared, needs the redis package)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 2048)
+    CACHE_TTL = int(os.environ.get('CACHE_TTL') or 600)
+    # Rendered wardrobe grid per (user, version, q, category, sort, page); same backend as above
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES') or 1024)
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 300)
+    # Session user cache (in-process); TTL bounds staleness across workers
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 4096)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    # /metrics (Prometheus text format): with METRICS_TOKEN set it requires 'Authorization: Bearer <token>',
+    # otherwise it answers loopback clients only unless METRICS_PUBLIC=1
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC') == '1'
+    # Log requests slower than this (ms) with their slowest SQL; 0 disables statement capture
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS') or 0)
+    METRICS_SLOW_TOP_SQL = 5
+    # Password hashing: Werkzeug method string (cost lives here; raising it rehashes users on next login)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = 16
+    # 'process' runs hashes in a bounded process pool, 'inline' on the request thread (tests/scripts)
+    PASSWORD_HASH_POOL = os.environ.get('PASSWORD_HASH_POOL') or 'process'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0)  # 0 = half the CPUs
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING') or 16)
+    PASSWORD_HASH_WAIT_TIMEOUT = float(os.environ.get('PASSWORD_HASH_WAIT_TIMEOUT') or 5)
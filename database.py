@@ -0,0 +1,129 @@
+"""
+Database engine setup
+SQLite connections get WAL journaling, a busy timeout and mmap pragmas; server
+databases get a sized connection pool. When DATABASE_REPLICA_URL is set, reads
+in routes marked @read_replica go to the replica while writes (and anything
+flushed) stay on the primary
+"""
+
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session as cookie_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+_STICKY_KEY = '_db_primary_until'
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured primary URL."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # pysqlite waits this long on a locked database before raising
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def configure(app) -> None:
+    """Fill in engine options and the replica bind; call before db.init_app()."""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    replica = app.config.get('DATABASE_REPLICA_URL')
+    if replica:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica, **engine_options({**app.config, 'SQLALCHEMY_DATABASE_URI': replica})}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+# -----------------------------
+# SQLite pragmas
+# -----------------------------
+def _sqlite_pragmas(config) -> list:
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+def _install_pragmas(engine, pragmas: list) -> None:
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+# -----------------------------
+# Read/write routing
+# -----------------------------
+class RoutingSession(FlaskSession):
+    """Sends plain reads to the replica engine while a request opted in via @read_replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) and _reading_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reading_replica() -> bool:
+    return has_request_context() and g.get('db_read_replica', False)
+
+
+def read_replica(view):
+    """Route GET requests of `view` to the replica, unless this client wrote recently.
+
+    After a write the client sticks to the primary for DB_REPLICA_STICKY_SECONDS,
+    so a redirect-after-POST never renders from a lagging replica.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET' and cookie_session.get(_STICKY_KEY, 0) < time.time():
+            g.db_read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _mark_flush(session, flush_context, instances) -> None:
+    if has_request_context() and (session.new or session.dirty or session.deleted):
+        g.db_wrote = True
+
+
+def _mark_statement(orm_execute_state) -> None:
+    if has_request_context() and not orm_execute_state.is_select:
+        g.db_wrote = True
+
+
+def _stick_to_primary(response):
+    if g.get('db_wrote'):
+        cookie_session[_STICKY_KEY] = time.time() + current_app.config['DB_REPLICA_STICKY_SECONDS']
+    return response
+
+
+def init_app(app, db) -> None:
+    """Install pragmas on SQLite engines and, with a replica configured, the write tracking."""
+    with app.app_context():
+        pragmas = _sqlite_pragmas(app.config)
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                _install_pragmas(engine, pragmas)
+
+    if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        event.listen(RoutingSession, 'before_flush', _mark_flush)
+        event.listen(RoutingSession, 'do_orm_execute', _mark_statement)
+        app.after_request(_stick_to_primary)
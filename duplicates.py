@@ -0,0 +1,177 @@
+"""
+Near-duplicate photo detection
+Every item photo gets a 64-bit DCT perceptual hash (robust to resizing,
+recompression and small crops/lighting changes). Hashes live in
+image_fingerprints split into four 16-bit bands: by pigeonhole, two hashes
+within Hamming distance r agree to within r // 4 bits on at least one band, so
+a lookup probes each band index for its few near values (multi-index hashing)
+and only checks the exact distance on those candidates
+"""
+
+import logging
+from functools import lru_cache
+from itertools import combinations
+
+import click
+import numpy as np
+from flask import current_app
+from PIL import Image, ImageOps
+from sqlalchemy import select, union
+
+from models import db, ImageFingerprint, WardrobeItem
+import images
+import storage
+
+log = logging.getLogger(__name__)
+
+HASH_SIZE = 8          # 8×8 low-frequency DCT coefficients -> 64 bits
+SAMPLE_SIZE = 32
+BANDS = 4
+BAND_BITS = 64 // BANDS
+MAX_BAND_RADIUS = 3    # 1 + 16 + 120 + 560 probes per band at most
+
+_N = np.arange(SAMPLE_SIZE)
+# orthonormal DCT-II basis, rows = frequencies
+_DCT = np.sqrt(2 / SAMPLE_SIZE) * np.cos(np.pi * (2 * _N[None, :] + 1) * _N[:, None] / (2 * SAMPLE_SIZE))
+_DCT[0] /= np.sqrt(2)
+
+
+# -----------------------------
+# Hashing
+# -----------------------------
+def phash(gray: np.ndarray) -> int:
+    """Unsigned 64-bit pHash of a SAMPLE_SIZE×SAMPLE_SIZE grayscale array."""
+    low = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])  # DC term excluded: it only tracks overall brightness
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_phash(path: str) -> int:
+    with Image.open(path) as im:
+        im.draft('L', (SAMPLE_SIZE * 4, SAMPLE_SIZE * 4))
+        im.seek(0)
+        im = ImageOps.exif_transpose(im).convert('L').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.LANCZOS)
+        return phash(np.asarray(im, dtype=np.float64))
+
+
+def to_signed(h: int) -> int:
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def to_unsigned(h: int) -> int:
+    return h & ((1 << 64) - 1)
+
+
+def bands(h: int) -> list:
+    mask = (1 << BAND_BITS) - 1
+    return [(h >> (BAND_BITS * (BANDS - 1 - i))) & mask for i in range(BANDS)]
+
+
+@lru_cache(maxsize=MAX_BAND_RADIUS + 1)
+def _flip_masks(radius: int) -> tuple:
+    return tuple(sum(1 << b for b in bits) for r in range(radius + 1)
+                 for bits in combinations(range(BAND_BITS), r))
+
+
+# -----------------------------
+# Index
+# -----------------------------
+def find_similar(user_id: int, h: int, max_distance: int, exclude_item_id=None, limit: int = 3) -> list:
+    """[(item_id, distance)] of the user's photos within `max_distance` bits of `h`, closest first."""
+    radius = min(max_distance // BANDS, MAX_BAND_RADIUS)
+    masks = _flip_masks(radius)
+    probes = []
+    for i, b in enumerate(bands(h)):
+        probe = select(ImageFingerprint.item_id, ImageFingerprint.phash).where(
+            ImageFingerprint.user_id == user_id,
+            getattr(ImageFingerprint, f'band{i}').in_({b ^ m for m in masks}),
+        )
+        if exclude_item_id is not None:
+            probe = probe.where(ImageFingerprint.item_id != exclude_item_id)
+        probes.append(probe)
+    # one indexed probe per band; a UNION keeps the planner from settling for a user_id-only scan
+    stmt = union(*probes)
+    with db.session.no_autoflush:
+        rows = db.session.execute(stmt).all()
+    hits = sorted(((h ^ to_unsigned(row.phash)).bit_count(), row.item_id) for row in rows)
+    return [(item_id, d) for d, item_id in hits if d <= max_distance][:limit]
+
+
+def set_fingerprint(item, h: int) -> None:
+    values = dict(user_id=item.user_id, phash=to_signed(h),
+                  **{f'band{i}': b for i, b in enumerate(bands(h))})
+    if item.fingerprint is None:
+        item.fingerprint = ImageFingerprint(**values)
+    else:
+        for column, value in values.items():
+            setattr(item.fingerprint, column, value)
+
+
+def fingerprint_upload(item) -> list:
+    """Hash `item`'s new photo and index it; returns existing items it likely duplicates.
+
+    Call before commit, after image_url is set. An unreadable image just goes
+    unindexed (image processing will mark it failed).
+    """
+    try:
+        h = image_phash(storage.local_path(item.image_url))
+    except Exception:
+        log.warning('Could not fingerprint %s', item.image_url, exc_info=True)
+        if item.fingerprint is not None:
+            item.fingerprint = None
+        return []
+    similar = find_similar(item.user_id, h, current_app.config['IMAGE_DUPLICATE_DISTANCE'],
+                           exclude_item_id=item.id)
+    set_fingerprint(item, h)
+    if not similar:
+        return []
+    by_id = {it.id: it for it in WardrobeItem.query.filter(WardrobeItem.id.in_([i for i, _ in similar]))}
+    return [by_id[i] for i, _ in similar if i in by_id]
+
+
+def duplicate_message(similar) -> str:
+    names = ', '.join(f'"{it.name}"' for it in similar)
+    return f'This photo looks like one already in your wardrobe: {names}.'
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill(batch_size: int = 200) -> int:
+    """Fingerprint items whose photo isn't indexed yet; safe to stop and re-run."""
+    config = current_app.config
+    count, last_id = 0, 0
+    while True:
+        batch = db.session.scalars(
+            select(WardrobeItem)
+            .outerjoin(ImageFingerprint, ImageFingerprint.item_id == WardrobeItem.id)
+            .where(WardrobeItem.image_url.isnot(None), ImageFingerprint.item_id.is_(None),
+                   WardrobeItem.id > last_id)
+            .order_by(WardrobeItem.id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        hashes = {}  # content-addressed: one hash per stored file
+        for item in batch:
+            path = images.url_to_path(item.image_url, config)
+            if path not in hashes:
+                try:
+                    hashes[path] = image_phash(path)
+                except Exception:
+                    hashes[path] = None
+            if hashes[path] is not None:
+                set_fingerprint(item, hashes[path])
+                count += 1
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+    return count
+
+
+def init_app(app) -> None:
+    @app.cli.command('images-fingerprint')
+    @click.option('--batch-size', default=200, show_default=True)
+    def images_fingerprint_command(batch_size):
+        """Index perceptual hashes of uploads that predate duplicate detection."""
+        n = backfill(batch_size)
+        click.echo(f'Fingerprinted {n} images.')
@@ -0,0 +1,228 @@
+"""
+Per-user wardrobe facets
+Item counts per category, color family and has-photo live in wardrobe_facets
+and are adjusted inside the same flush that adds, edits or deletes items, so
+the wardrobe filters read one user's key range instead of grouping the whole
+closet. facets-repair recomputes them from the items should they ever drift
+"""
+
+from collections import Counter
+from typing import NamedTuple
+
+import click
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import db, User, WardrobeFacet, WardrobeItem
+
+FACETS = ('category', 'color_family', 'has_image')
+NO_VALUE = 'none'   # items without a color family
+_UNKNOWN = object()
+
+
+def item_values(category, color_family, image_url) -> tuple:
+    return category, color_family or NO_VALUE, 'yes' if image_url else 'no'
+
+
+def _keys(user_id, values) -> list:
+    return [(user_id, facet, value) for facet, value in zip(FACETS, values)]
+
+
+class Selection(NamedTuple):
+    """Facet values picked on /wardrobe or /api/wardrobe ('' = any)."""
+    category: str = ''
+    color_family: str = ''
+    has_image: str = ''
+
+    @classmethod
+    def from_args(cls, args) -> 'Selection':
+        return cls(*(args.get(facet, '').strip() for facet in FACETS))
+
+    def apply(self, query):
+        if self.category:
+            query = query.filter(WardrobeItem.category == self.category)
+        if self.color_family == NO_VALUE:
+            query = query.filter(WardrobeItem.color_family.is_(None))
+        elif self.color_family:
+            query = query.filter(WardrobeItem.color_family == self.color_family)
+        if self.has_image in ('yes', 'no'):
+            has = WardrobeItem.image_url.isnot(None)
+            query = query.filter(has if self.has_image == 'yes' else ~has)
+        return query
+
+    def url_args(self) -> dict:
+        return {facet: value for facet, value in self._asdict().items() if value}
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def for_user(user_id: int) -> dict:
+    """{facet: {value: count}} for every facet, most common value first."""
+    rows = db.session.execute(
+        select(WardrobeFacet.facet, WardrobeFacet.value, WardrobeFacet.count)
+        .where(WardrobeFacet.user_id == user_id, WardrobeFacet.count > 0)
+    ).all()
+    result = {facet: {} for facet in FACETS}
+    for row in sorted(rows, key=lambda r: (-r.count, r.value)):
+        result.setdefault(row.facet, {})[row.value] = row.count
+    return result
+
+
+# -----------------------------
+# Incremental maintenance
+# -----------------------------
+def _current(item) -> tuple:
+    return item_values(item.category, item.color_family, item.image_url)
+
+
+def _committed(item):
+    """Facet values as they were before this flush, or _UNKNOWN if an attribute wasn't loaded."""
+    state = inspect(item)
+    old = []
+    for attr in ('category', 'color_family', 'image_url'):
+        history = state.attrs[attr].history
+        if history.deleted:
+            old.append(history.deleted[0])
+        elif not history.added and attr in state.dict:
+            old.append(state.dict[attr])
+        else:
+            return _UNKNOWN  # overwritten (or expired) without being loaded first
+    return item_values(*old)
+
+
+def apply_deltas(conn, deltas: Counter) -> None:
+    """Add each (user_id, facet, value) delta to its counter row, creating rows as needed."""
+    rows = [{'user_id': u, 'facet': f, 'value': v, 'count': n} for (u, f, v), n in deltas.items() if n]
+    if not rows:
+        return
+    table = WardrobeFacet.__table__
+    if conn.dialect.name in ('sqlite', 'postgresql'):
+        if conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.facet, table.c.value],
+            set_={'count': table.c.count + stmt.excluded['count']},
+        ), rows)
+        return
+    for row in rows:
+        result = conn.execute(
+            update(table)
+            .where(table.c.user_id == row['user_id'], table.c.facet == row['facet'], table.c.value == row['value'])
+            .values(count=table.c.count + row['count'])
+        )
+        if not result.rowcount:
+            conn.execute(table.insert().values(**row))
+
+
+def change_deltas(user_id: int, old_values, new_values=()) -> Counter:
+    """Deltas for items leaving `old_values` and entering `new_values` (item_values() tuples)."""
+    deltas = Counter()
+    for values in old_values:
+        deltas.subtract(_keys(user_id, values))
+    for values in new_values:
+        deltas.update(_keys(user_id, values))
+    return deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_facets(session, flush_context):
+    # history is still pre-flush here, and the counter updates join the same transaction
+    deltas = Counter()
+    rebuild = set()
+    for obj in session.new:
+        if isinstance(obj, WardrobeItem):
+            deltas.update(_keys(obj.user_id, _current(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, WardrobeItem):
+            old = _committed(obj)
+            if old is _UNKNOWN:
+                rebuild.add(obj.user_id)
+            else:
+                deltas.subtract(_keys(obj.user_id, old))
+    for obj in session.dirty:
+        if not isinstance(obj, WardrobeItem) or not session.is_modified(obj):
+            continue
+        old = _committed(obj)
+        if old is _UNKNOWN:
+            rebuild.add(obj.user_id)
+            continue
+        new = _current(obj)
+        if new != old:
+            deltas.subtract(_keys(obj.user_id, old))
+            deltas.update(_keys(obj.user_id, new))
+
+    if not deltas and not rebuild:
+        return
+    conn = session.connection()
+    apply_deltas(conn, Counter({k: n for k, n in deltas.items() if k[0] not in rebuild}))
+    for user_id in rebuild:
+        rebuild_user(conn, user_id)
+
+
+# -----------------------------
+# Repair
+# -----------------------------
+def expected_counts(conn, user_ids) -> Counter:
+    rows = conn.execute(
+        select(WardrobeItem.user_id, WardrobeItem.category, WardrobeItem.color_family,
+               WardrobeItem.image_url.isnot(None).label('has_image'), func.count().label('n'))
+        .where(WardrobeItem.user_id.in_(user_ids))
+        .group_by(WardrobeItem.user_id, WardrobeItem.category, WardrobeItem.color_family, 'has_image')
+    ).all()
+    counts = Counter()
+    for r in rows:
+        for key in _keys(r.user_id, item_values(r.category, r.color_family, r.has_image)):
+            counts[key] += r.n
+    return counts
+
+
+def stored_counts(conn, user_ids) -> Counter:
+    return Counter({
+        (r.user_id, r.facet, r.value): r.count
+        for r in conn.execute(select(WardrobeFacet.user_id, WardrobeFacet.facet, WardrobeFacet.value,
+                                     WardrobeFacet.count).where(WardrobeFacet.user_id.in_(user_ids)))
+    })
+
+
+def rebuild_user(conn, user_id: int) -> None:
+    conn.execute(delete(WardrobeFacet.__table__).where(WardrobeFacet.user_id == user_id))
+    apply_deltas(conn, expected_counts(conn, [user_id]))
+
+
+def repair(user_ids=None, batch_size: int = 500) -> int:
+    """Recompute facet counts from the items; returns how many counters were wrong."""
+    if user_ids is None:
+        user_ids = db.session.scalars(select(User.id).order_by(User.id)).all()
+    drift = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        conn = db.session.connection()
+        expected, stored = expected_counts(conn, batch), stored_counts(conn, batch)
+        fix = Counter({key: expected[key] - stored[key] for key in expected.keys() | stored.keys()
+                       if expected[key] != stored[key]})
+        apply_deltas(conn, fix)
+        conn.execute(delete(WardrobeFacet.__table__).where(
+            WardrobeFacet.user_id.in_(batch), WardrobeFacet.count == 0
+        ))
+        db.session.commit()
+        drift += len(fix)
+    return drift
+
+
+def init_app(app) -> None:
+    @app.cli.command('facets-repair')
+    @click.option('--email', help='Only this user.')
+    def facets_repair_command(email):
+        """Recompute per-user wardrobe facet counts from the items."""
+        user_ids = None
+        if email:
+            user = User.query.filter_by(email=email.strip().lower()).first()
+            if not user:
+                raise click.ClickException(f'No user with email {email}.')
+            user_ids = [user.id]
+        n = repair(user_ids)
+        click.echo(f'Fixed {n} facet counters.' if n else 'Facet counts are consistent.')
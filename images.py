@@ -0,0 +1,218 @@
+"""
+Background image processing for wardrobe uploads
+A bounded worker pool turns each saved upload into metadata-free WebP variants
+(grid thumbnail + display size) and records their URLs on the WardrobeItem,
+along with the photo's dominant colors. Originals are content-addressed and
+never rewritten; only variants are served to the grid and edit pages
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import click
+from flask import current_app
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import or_, select
+
+from models import db, WardrobeItem
+import cache
+import colors
+
+log = logging.getLogger(__name__)
+
+VARIANTS = {
+    # column: (filename suffix, config key holding the max edge in px)
+    'thumb_url': ('_thumb.webp', 'IMAGE_THUMB_SIZE'),
+    'webp_url': ('_md.webp', 'IMAGE_WEBP_MAX_SIZE'),
+}
+
+
+class ImagePipeline:
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='image-worker'
+        )
+        # caps queued + running jobs; beyond it uploads stay 'pending' for the CLI
+        self.slots = threading.BoundedSemaphore(app.config['IMAGE_QUEUE_MAX'])
+
+    def submit(self, item_id: int) -> bool:
+        if self.app.config['IMAGE_PROCESSING'] == 'inline':
+            self.process_item(item_id)
+            return True
+        if not self.slots.acquire(blocking=False):
+            log.warning('Image queue full; item %s left pending', item_id)
+            return False
+        try:
+            self.executor.submit(self._job, item_id)
+        except RuntimeError:
+            self.slots.release()
+            return False
+        return True
+
+    def _job(self, item_id: int) -> None:
+        try:
+            with self.app.app_context():
+                self.process_item(item_id)
+        finally:
+            self.slots.release()
+
+    def process_item(self, item_id: int) -> None:
+        item = db.session.get(WardrobeItem, item_id)
+        if not item or not item.image_url:
+            return
+        image_url = item.image_url
+        try:
+            urls, swatches = process_image(image_url, self.app.config)
+        except Exception:
+            log.exception('Image processing failed for item %s', item_id)
+            urls = None
+        db.session.refresh(item)
+        if item.image_url != image_url:
+            # replaced while we worked; the newer upload has its own job
+            db.session.rollback()
+            return
+        if urls is None:
+            item.image_status = 'failed'
+        else:
+            for column, url in urls.items():
+                setattr(item, column, url)
+            colors.apply_detected(item, swatches, self.app.config['IMAGE_COLOR_AUTOFILL'])
+            item.image_status = 'ready'
+            cache.invalidate_recommendations(item.user)  # new thumbnail: cached wardrobe pages are stale
+        db.session.commit()
+
+
+def url_to_path(url: str, config) -> str:
+    return os.path.join(config['UPLOAD_FOLDER'], os.path.basename(url))
+
+
+def process_image(image_url: str, config) -> tuple:
+    """Write metadata-free WebP variants next to the original; returns ({column: url}, swatches)."""
+    src = url_to_path(image_url, config)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    url_dir = image_url.rsplit('/', 1)[0]
+
+    names = {column: f'{stem}{suffix}' for column, (suffix, _) in VARIANTS.items()}
+    if all(os.path.exists(os.path.join(os.path.dirname(src), n)) for n in names.values()):
+        # same content was uploaded before; its variants are already on disk
+        swatches = image_swatches(src, config['IMAGE_COLOR_CLUSTERS'], config['IMAGE_COLOR_SAMPLE'])
+        return {column: f'{url_dir}/{n}' for column, n in names.items()}, swatches
+
+    with Image.open(src) as im:
+        im.seek(0)
+        im = ImageOps.exif_transpose(im)
+        has_alpha = im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+        im = im.convert('RGBA' if has_alpha else 'RGB')
+        swatches = sample_colors(im, config['IMAGE_COLOR_CLUSTERS'], config['IMAGE_COLOR_SAMPLE'])
+
+        urls = {}
+        for column, (suffix, size_key) in VARIANTS.items():
+            variant = im.copy()
+            variant.thumbnail((config[size_key], config[size_key]), Image.LANCZOS)
+            fname = f'{stem}{suffix}'
+            variant.save(os.path.join(os.path.dirname(src), fname), 'WEBP',
+                         quality=config['IMAGE_WEBP_QUALITY'], method=4)
+            urls[column] = f'{url_dir}/{fname}'
+    return urls, swatches
+
+
+def sample_colors(im, k: int, sample: int) -> list:
+    """Dominant colors of a PIL image, k-means over a copy at most `sample` px on a side."""
+    scale = min(1.0, sample / max(im.size))
+    # nearest-neighbour keeps real pixel colors; a smoothing filter would invent edge blends
+    small = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))), Image.NEAREST)
+    return colors.dominant_colors(np.asarray(small.convert('RGBA')), k)
+
+
+def image_swatches(path: str, k: int, sample: int) -> list:
+    with Image.open(path) as im:
+        im.draft('RGB', (sample * 2, sample * 2))  # JPEGs decode straight at a reduced scale
+        im.seek(0)
+        return sample_colors(im, k, sample)
+
+
+def _swatches_job(args):
+    # runs in a worker process: no app, no database, just the file
+    path, k, sample = args
+    try:
+        return image_swatches(path, k, sample)
+    except Exception:
+        return None
+
+
+def variant_paths(item, config) -> list:
+    return [url_to_path(getattr(item, column), config) for column in VARIANTS if getattr(item, column)]
+
+
+def backfill_colors(workers: int, batch_size: int = 200, reprocess_all: bool = False, echo=lambda m: None) -> int:
+    """Sample dominant colors for existing uploads across a process pool.
+
+    Resumable: each batch is committed as it completes and only items without
+    image_colors are selected, so an interrupted run picks up where it stopped.
+    Unreadable images are recorded as '' and not retried without --all.
+    """
+    config = current_app.config
+    k, sample = config['IMAGE_COLOR_CLUSTERS'], config['IMAGE_COLOR_SAMPLE']
+    done, last_id = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            stmt = (select(WardrobeItem).where(WardrobeItem.image_url.isnot(None), WardrobeItem.id > last_id)
+                    .order_by(WardrobeItem.id).limit(batch_size))
+            if not reprocess_all:
+                stmt = stmt.where(WardrobeItem.image_colors.is_(None))
+            batch = db.session.scalars(stmt).all()
+            if not batch:
+                break
+            # uploads are content-addressed: items sharing a blob are sampled once
+            paths = sorted({url_to_path(item.image_url, config) for item in batch})
+            results = dict(zip(paths, pool.map(_swatches_job, [(p, k, sample) for p in paths],
+                                               chunksize=max(1, len(paths) // (workers * 4)))))
+            changed_users = set()
+            for item in batch:
+                swatches = results[url_to_path(item.image_url, config)] or []
+                if colors.apply_detected(item, swatches, config['IMAGE_COLOR_AUTOFILL']):
+                    changed_users.add(item.user)
+            for user in changed_users:
+                cache.invalidate_recommendations(user)
+            last_id = batch[-1].id
+            db.session.commit()
+            db.session.expunge_all()
+            done += len(batch)
+            echo(f'{done} items sampled (through id {last_id})')
+    return done
+
+
+def enqueue(item) -> None:
+    """Hand a committed item with a new image_url to the worker pool."""
+    current_app.extensions['image_pipeline'].submit(item.id)
+
+
+def init_app(app) -> None:
+    app.extensions['image_pipeline'] = ImagePipeline(app)
+
+    @app.cli.command('images-process')
+    @click.option('--all', 'reprocess_all', is_flag=True, help='Rebuild variants for every image.')
+    def images_process_command(reprocess_all):
+        """Build thumbnails/WebP variants for pending or failed uploads."""
+        stmt = select(WardrobeItem.id).where(WardrobeItem.image_url.isnot(None))
+        if not reprocess_all:
+            stmt = stmt.where(or_(WardrobeItem.image_status.is_(None),
+                                  WardrobeItem.image_status.in_(['pending', 'failed'])))
+        pipeline = app.extensions['image_pipeline']
+        ids = db.session.scalars(stmt).all()
+        for item_id in ids:
+            pipeline.process_item(item_id)
+        click.echo(f'Processed {len(ids)} images.')
+
+    @app.cli.command('images-colors')
+    @click.option('--all', 'reprocess_all', is_flag=True, help='Resample every image, not only unsampled ones.')
+    @click.option('--workers', type=int, default=0, help='Worker processes (default: one per core).')
+    @click.option('--batch-size', default=200, show_default=True)
+    def images_colors_command(reprocess_all, workers, batch_size):
+        """Extract dominant colors from existing uploads and fill blank item colors."""
+        n = backfill_colors(workers or os.cpu_count() or 1, batch_size, reprocess_all, click.echo)
+        click.echo(f'Sampled colors for {n} items.')
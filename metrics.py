@@ -0,0 +1,206 @@
+"""
+Request instrumentation and Prometheus metrics
+Per endpoint: request count/latency histogram, SQL statement count and time
+(engine events), template render time and upload bytes. Served at /metrics in
+the Prometheus text format; an opt-in slow-request log names the worst SQL
+"""
+
+import functools
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Response, abort, current_app, g, has_request_context, request, template_rendered, \
+    before_render_template
+from sqlalchemy import event
+
+log = logging.getLogger('glamdiva.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_CAPTURED_STATEMENTS = 200
+UPLOAD_MIMETYPES = ('multipart/form-data', 'application/octet-stream')  # forms and resumable-upload chunks
+LOOPBACK_ADDRS = ('127.0.0.1', '::1')
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'sql_seconds', 'template_seconds', 'template_started', 'statements')
+
+    def __init__(self, capture_sql: bool):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_started = None
+        self.statements = [] if capture_sql else None
+
+
+class Registry:
+    """In-process counters; each worker process exposes its own (scrape them all or aggregate upstream)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)            # (endpoint, method, status) -> count
+        self.latency_buckets = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.upload_bytes = defaultdict(int)
+
+    def observe(self, endpoint: str, method: str, status: int, seconds: float, stats: RequestStats,
+                upload_bytes: int) -> None:
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.latency_buckets[endpoint][bisect_left(self.buckets, seconds)] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency_count[endpoint] += 1
+            self.sql_queries[endpoint] += stats.queries
+            self.sql_seconds[endpoint] += stats.sql_seconds
+            self.template_seconds[endpoint] += stats.template_seconds
+            if upload_bytes:
+                self.upload_bytes[endpoint] += upload_bytes
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+
+            def family(name, kind, help_text, samples):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(samples)
+
+            family('glamdiva_requests_total', 'counter', 'HTTP requests handled.', [
+                f'glamdiva_requests_total{{endpoint="{e}",method="{m}",status="{s}"}} {v}'
+                for (e, m, s), v in sorted(self.requests.items())
+            ])
+
+            samples = []
+            for endpoint in sorted(self.latency_count):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), self.latency_buckets[endpoint]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    samples.append(f'glamdiva_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+                samples.append(f'glamdiva_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.6f}')
+                samples.append(f'glamdiva_request_duration_seconds_count{{endpoint="{endpoint}"}} {self.latency_count[endpoint]}')
+            family('glamdiva_request_duration_seconds', 'histogram', 'Request latency.', samples)
+
+            for name, help_text, data, fmt in (
+                ('glamdiva_sql_queries_total', 'SQL statements executed.', self.sql_queries, '{}'),
+                ('glamdiva_sql_seconds_total', 'Time spent executing SQL.', self.sql_seconds, '{:.6f}'),
+                ('glamdiva_template_render_seconds_total', 'Time spent rendering templates.', self.template_seconds, '{:.6f}'),
+                ('glamdiva_upload_bytes_total', 'Request bytes received on multipart uploads and upload chunks.', self.upload_bytes, '{}'),
+            ):
+                family(name, 'counter', help_text, [
+                    f'{name}{{endpoint="{e}"}} ' + fmt.format(v) for e, v in sorted(data.items())
+                ])
+        return '\n'.join(lines) + '\n'
+
+
+def _stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+# -----------------------------
+# Hooks
+# -----------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _stats() is not None:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    if stats is None or not conn.info.get('metrics_started'):
+        return
+    elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+    stats.queries += 1
+    stats.sql_seconds += elapsed
+    if stats.statements is not None and len(stats.statements) < MAX_CAPTURED_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+
+def _on_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('metrics_started'):
+        conn.info['metrics_started'].pop()
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats.template_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats.template_started is not None:
+        stats.template_seconds += time.perf_counter() - stats.template_started
+        stats.template_started = None
+
+
+def _start_request():
+    g.request_stats = RequestStats(capture_sql=current_app.config['METRICS_SLOW_REQUEST_MS'] > 0)
+
+
+def _finish_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    # streamed bodies (stream_template, exports) query and render after this hook
+    # returns, so the request is recorded once the server closes the response
+    upload = (request.content_length or 0) if request.mimetype in UPLOAD_MIMETYPES else 0
+    response.call_on_close(functools.partial(
+        _record, current_app._get_current_object(), stats, request.endpoint or 'unmatched',
+        request.method, request.path, response.status_code, upload,
+    ))
+    return response
+
+
+def _record(app, stats: RequestStats, endpoint: str, method: str, path: str, status: int, upload: int) -> None:
+    seconds = time.perf_counter() - stats.started
+    app.extensions['metrics'].observe(endpoint, method, status, seconds, stats, upload)
+
+    slow_ms = app.config['METRICS_SLOW_REQUEST_MS']
+    if slow_ms and seconds * 1000 >= slow_ms:
+        worst = sorted(stats.statements or [], reverse=True)[:app.config['METRICS_SLOW_TOP_SQL']]
+        log.warning(
+            'slow request %s %s (%s) %.1fms: %d queries / %.1fms SQL, %.1fms templates%s',
+            method, path, endpoint, seconds * 1000, stats.queries,
+            stats.sql_seconds * 1000, stats.template_seconds * 1000,
+            ''.join(f'\n  {elapsed * 1000:8.2f}ms  {" ".join(sql.split())}' for elapsed, sql in worst),
+        )
+
+
+def registry() -> Registry:
+    return current_app.extensions['metrics']
+
+
+def init_app(app, db) -> None:
+    app.extensions['metrics'] = Registry()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _on_error)
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            # compare bytes: compare_digest raises TypeError on non-ASCII str
+            supplied = request.headers.get('Authorization', '').encode('utf-8')
+            if not hmac.compare_digest(supplied, f'Bearer {token}'.encode('utf-8')):
+                abort(401)
+        elif not app.config['METRICS_PUBLIC'] and request.remote_addr not in LOOPBACK_ADDRS:
+            abort(403)  # without a token, only local scrapers may read traffic and slow-SQL data
+        return Response(registry().render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,174 @@
+"""
+Versioned schema migrations
+Each migration runs once, in order, from `flask db-upgrade` (deploy step or
+first local run) and is recorded in schema_migrations. Workers never touch the
+schema at boot. Migrations must be idempotent: a fresh database already gets
+new columns from create_all() in migration 1, so later ones check first
+"""
+
+from datetime import datetime
+
+import click
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from models import db
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(120), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        assert all(v != version for v, _, _ in MIGRATIONS), f'duplicate migration {version}'
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def add_missing_columns(conn) -> None:
+    """ALTER TABLE ADD COLUMN for nullable model columns an older table lacks."""
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        present = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+
+def add_missing_indexes(conn) -> None:
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# -----------------------------
+# Migrations
+# -----------------------------
+@migration(1, 'create tables')
+def _create_tables(conn):
+    db.metadata.create_all(conn)
+
+
+@migration(2, 'add wardrobe/user columns added after the first release')
+def _add_columns(conn):
+    add_missing_columns(conn)
+
+
+@migration(3, 'add missing indexes')
+def _add_indexes(conn):
+    add_missing_indexes(conn)
+
+
+@migration(4, 'wardrobe full-text search index')
+def _search_index(conn):
+    import search
+    if search.get_backend().create(conn):
+        search.reindex()
+
+
+@migration(5, 'styler keyword tags')
+def _tags(conn):
+    import tags
+    tags.backfill()
+
+
+@migration(6, 'canonical wardrobe colors')
+def _colors(conn):
+    import colors
+    colors.backfill()
+
+
+@migration(7, 'photo color columns')
+def _photo_colors(conn):
+    add_missing_columns(conn)
+
+
+@migration(8, 'image fingerprints for duplicate detection')
+def _image_fingerprints(conn):
+    db.metadata.create_all(conn)  # new table only; existing ones are left alone
+
+
+@migration(9, 'resumable upload sessions')
+def _upload_sessions(conn):
+    db.metadata.create_all(conn)
+
+
+@migration(10, 'wardrobe facet counts')
+def _facets(conn):
+    db.metadata.create_all(conn)
+    add_missing_columns(conn)
+    import colors
+    import facets
+    colors.backfill()
+    facets.repair()
+
+
+@migration(11, 'precomputed recommendations')
+def _precomputed_recommendations(conn):
+    db.metadata.create_all(conn)
+
+
+@migration(12, 'scope the search index by owner')
+def _search_index_owner(conn):
+    import search
+    if search.get_backend().create(conn):
+        search.reindex()
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def applied_versions() -> set:
+    conn = db.session.connection()
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def pending() -> list:
+    done = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def upgrade(echo=lambda message: None) -> int:
+    """Apply pending migrations in order; returns how many ran."""
+    schema_migrations.create(db.session.connection(), checkfirst=True)
+    db.session.commit()
+    todo = pending()
+    for version, name, fn in todo:
+        echo(f'Applying {version:04d} {name}')
+        fn(db.session.connection())
+        db.session.execute(schema_migrations.insert().values(
+            version=version, name=name, applied_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    return len(todo)
+
+
+def init_app(app) -> None:
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema/data migrations."""
+        n = upgrade(click.echo)
+        click.echo(f'Applied {n} migrations.' if n else 'Database is up to date.')
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """List migrations and whether each has been applied."""
+        done = applied_versions()
+        for version, name, _ in MIGRATIONS:
+            click.echo(f"{'applied' if version in done else 'pending'}  {version:04d} {name}")
@@ -1,14 +1,16 @@
 """
 Database models for the GlamDiva application
-User (auth), UserProfile (styler), WardrobeItem (closet)
+User (auth), UserProfile (styler), WardrobeItem (closet), Tag (item keywords),
+UploadBlob (content-addressed image files)
 """
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
-db = SQLAlchemy()
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # -----------------------------
 # User
@@ -24,6 +26,7 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    data_version = db.Column(db.Integer, default=0)   # bumped on every profile/wardrobe write
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -41,12 +44,6 @@ class User(UserMixin, db.Model):
         cascade='all, delete-orphan'
     )
 
-    def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
-
     def __repr__(self) -> str:
         return f'<User {self.email}>'
 
@@ -65,9 +62,8 @@ class UserProfile(db.Model):
         db.Integer,
         db.ForeignKey('users.id', ondelete='CASCADE'),
         unique=True,
-        nullable=False,
-        index=True
-    )
+        nullable=False
+    )   # indexed by ix_user_profiles_user_id
 
     # Styler attributes
     skin_tone = db.Column(db.String(50))    # e.g., 'very fair', 'medium', 'deep'
@@ -85,6 +81,27 @@ class UserProfile(db.Model):
         return f'<UserProfile user_id={self.user_id}>'
 
 
+# -----------------------------
+# Tags (write-time keyword index for styler matching)
+# -----------------------------
+wardrobe_item_tags = db.Table(
+    'wardrobe_item_tags',
+    db.Column('item_id', db.Integer, db.ForeignKey('wardrobe_items.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_wardrobe_item_tags_tag_item', 'tag_id', 'item_id'),
+)
+
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(60), unique=True, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<Tag {self.name}>'
+
+
 # -----------------------------
 # WardrobeItem
 # -----------------------------
@@ -95,6 +112,9 @@ class WardrobeItem(db.Model):
         db.Index('ix_wardrobe_items_name', 'name'),
         db.Index('ix_wardrobe_items_category', 'category'),
         db.Index('ix_wardrobe_items_created', 'created_at'),
+        # keyset pagination: one seek per page for each sort mode
+        db.Index('ix_wardrobe_items_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_wardrobe_items_user_name_id', 'user_id', 'name', 'id'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -108,12 +128,25 @@ class WardrobeItem(db.Model):
     name = db.Column(db.String(120), nullable=False)
     category = db.Column(db.String(80), nullable=False)    # e.g., 'Top', 'Bottom'
     color = db.Column(db.String(60))                       # e.g., 'Navy Blue'
+    color_hex = db.Column(db.String(7))                    # canonical sRGB parsed from color
+    color_l = db.Column(db.Float)                          # CIELAB of color_hex
+    color_a = db.Column(db.Float)
+    color_b = db.Column(db.Float)
+    color_family = db.Column(db.String(20))                # coarse family of color_hex: 'blue', 'beige'...
     notes = db.Column(db.String(255))
-    image_url = db.Column(db.String(255))                  # optional future
+    image_url = db.Column(db.String(255))                  # original upload
+    image_hash = db.Column(db.String(64), index=True)      # UploadBlob.sha256 of image_url
+    thumb_url = db.Column(db.String(255))                  # small WebP for grids
+    webp_url = db.Column(db.String(255))                   # display-size WebP
+    image_status = db.Column(db.String(20))                # 'pending', 'ready', 'failed'
+    image_colors = db.Column(db.String(64))                # dominant photo colors, '#hex,...' largest first
+    color_detected = db.Column(db.Boolean, default=False)  # color was filled in from the photo
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     user = db.relationship('User', back_populates='wardrobe_items')
+    tags = db.relationship('Tag', secondary=wardrobe_item_tags)
+    fingerprint = db.relationship('ImageFingerprint', uselist=False, cascade='all, delete-orphan')
 
     def to_dict(self) -> dict:
         return {
@@ -122,10 +155,120 @@ class WardrobeItem(db.Model):
             'name': self.name,
             'category': self.category,
             'color': self.color,
+            'color_hex': self.color_hex,
             'notes': self.notes,
             'image_url': self.image_url,
+            'thumb_url': self.thumb_url,
+            'webp_url': self.webp_url,
+            'image_colors': self.image_colors.split(',') if self.image_colors else [],
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
     def __repr__(self) -> str:
         return f'<WardrobeItem {self.name} user_id={self.user_id}>'
+
+
+# -----------------------------
+# WardrobeFacet (per-user filter counts)
+# -----------------------------
+class WardrobeFacet(db.Model):
+    """Item count for one (user, facet, value), kept current by facets.py on every flush."""
+    __tablename__ = 'wardrobe_facets'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    facet = db.Column(db.String(20), primary_key=True)    # 'category', 'color_family', 'has_image'
+    value = db.Column(db.String(80), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f'<WardrobeFacet user_id={self.user_id} {self.facet}={self.value} x{self.count}>'
+
+
+# -----------------------------
+# PrecomputedRecommendation (offline styler/colour results)
+# -----------------------------
+class PrecomputedRecommendation(db.Model):
+    """Styler and colour-analysis results computed by `flask recommendations-precompute`.
+
+    Valid only while data_version and rules_fingerprint still match the user
+    and the active styling rules; otherwise the routes compute live.
+    """
+    __tablename__ = 'precomputed_recommendations'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)
+    rules_fingerprint = db.Column(db.String(12), nullable=False)
+    styler = db.Column(db.Text, nullable=False)    # JSON, as styler_recommendations() returns it
+    colour = db.Column(db.Text, nullable=False)    # JSON, as colour_recommendations() returns it
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<PrecomputedRecommendation user_id={self.user_id} v{self.data_version}>'
+
+
+# -----------------------------
+# UploadBlob
+# -----------------------------
+class UploadBlob(db.Model):
+    __tablename__ = 'upload_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<UploadBlob {self.sha256[:12]} refs={self.ref_count}>'
+
+
+# -----------------------------
+# UploadSession (resumable uploads)
+# -----------------------------
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    __table_args__ = (
+        db.Index('ix_upload_sessions_user', 'user_id'),
+        db.Index('ix_upload_sessions_updated', 'updated_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)       # random token; also the partial file's name
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)          # total bytes announced by the client
+    received = db.Column(db.Integer, nullable=False, default=0)
+    checksum = db.Column(db.String(64))                   # expected SHA-256 hex, if the client sent one
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<UploadSession {self.id} {self.received}/{self.size}>'
+
+
+# -----------------------------
+# ImageFingerprint (near-duplicate photo index)
+# -----------------------------
+class ImageFingerprint(db.Model):
+    """64-bit perceptual hash of an item's photo, also stored as four 16-bit bands.
+
+    Each (user_id, band) pair is indexed, so lookups within a Hamming radius
+    probe a handful of index ranges instead of scanning every photo.
+    """
+    __tablename__ = 'image_fingerprints'
+    __table_args__ = tuple(
+        db.Index(f'ix_image_fingerprints_user_band{i}', 'user_id', f'band{i}') for i in range(4)
+    )
+
+    item_id = db.Column(db.Integer, db.ForeignKey('wardrobe_items.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    phash = db.Column(db.BigInteger, nullable=False)   # signed 64-bit, as SQLite stores integers
+    band0 = db.Column(db.Integer, nullable=False)
+    band1 = db.Column(db.Integer, nullable=False)
+    band2 = db.Column(db.Integer, nullable=False)
+    band3 = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<ImageFingerprint item_id={self.item_id} {self.phash & (2 ** 64 - 1):016x}>'
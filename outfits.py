@@ -0,0 +1,170 @@
+"""
+Outfit builder
+Combines wardrobe items across categories into complete outfits. Each item
+gets a unary score (palette fit, colors to avoid, occasion keywords) and every
+pair a color-harmony score, all computed once as NumPy arrays; a beam search
+over the category slots keeps only the best partial outfits under a time budget
+"""
+
+import time
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import literal, select
+
+from models import db, WardrobeItem
+import colors
+import tags
+
+# Slot sequences an outfit can follow; a slot in OPTIONAL may be left empty
+SEQUENCES = (
+    ('Top', 'Bottom', 'Footwear', 'Outerwear'),
+    ('Dress', 'Footwear', 'Outerwear'),
+)
+OPTIONAL = {'Outerwear'}
+
+NEUTRAL_CHROMA = 15.0     # below this Lab chroma a color reads as neutral
+PALETTE_RADIUS = 40.0     # delta-E at which palette affinity drops to zero
+AVOID_RADIUS = 25.0
+
+
+class ItemFeatures(NamedTuple):
+    ids: np.ndarray          # (N,) item ids
+    categories: np.ndarray   # (N,) category names
+    lab: np.ndarray          # (N, 3) CIELAB, NaN where the color is unknown
+    unary: np.ndarray        # (N,) per-item score
+
+
+def load_features(user_id: int, good_hexes=(), avoid_hexes=(), occasion_words=()) -> ItemFeatures:
+    """One query for the user's outfit-eligible items, scored against the palette and occasion."""
+    slots = sorted({slot for seq in SEQUENCES for slot in seq})
+    occasion = (WardrobeItem.id.in_(tags.items_tagged_any(occasion_words)) if occasion_words
+                else literal(False))
+    rows = db.session.execute(
+        select(WardrobeItem.id, WardrobeItem.category, WardrobeItem.color_l, WardrobeItem.color_a,
+               WardrobeItem.color_b, occasion.label('occasion'))
+        .where(WardrobeItem.user_id == user_id, WardrobeItem.category.in_(slots))
+    ).all()
+    if not rows:
+        empty = np.empty(0)
+        return ItemFeatures(empty.astype(int), empty.astype(str), np.empty((0, 3)), empty)
+
+    ids = np.array([r.id for r in rows])
+    categories = np.array([r.category for r in rows])
+    lab = np.array([(r.color_l, r.color_a, r.color_b) for r in rows], dtype=np.float64)
+    known = ~np.isnan(lab).any(axis=1)
+
+    unary = np.array([0.6 if r.occasion else 0.0 for r in rows])
+    if good_hexes and known.any():
+        good = colors.delta_e(lab[known], colors.palette_lab(tuple(good_hexes))).min(axis=1)
+        affinity = np.clip(1 - good / PALETTE_RADIUS, 0, 1)
+        if avoid_hexes:
+            avoid = colors.delta_e(lab[known], colors.palette_lab(tuple(avoid_hexes))).min(axis=1)
+            affinity -= 0.5 * ((avoid < good) & (avoid < AVOID_RADIUS))
+        unary[known] += affinity
+    return ItemFeatures(ids, categories, lab, unary)
+
+
+def harmony_matrix(lab: np.ndarray) -> np.ndarray:
+    """Pairwise color compatibility in [-0.3, 0.8] for N Lab colors -> N×N.
+
+    Neutrals go with anything; otherwise analogous hues score best,
+    complementary ones well, and everything in between clashes.
+    """
+    n = len(lab)
+    known = ~np.isnan(lab).any(axis=1)
+    chroma = np.hypot(lab[:, 1], lab[:, 2])
+    hue = np.degrees(np.arctan2(lab[:, 2], lab[:, 1]))
+    neutral = known & (chroma < NEUTRAL_CHROMA)
+
+    diff = np.abs(hue[:, None] - hue[None, :]) % 360
+    diff = np.minimum(diff, 360 - diff)
+    score = np.where(diff < 35, 0.8, np.where(diff > 150, 0.5, -0.3))
+    # lightness contrast between neutrals and colors reads as deliberate
+    contrast = np.abs(lab[:, None, 0] - lab[None, :, 0]) / 100
+    score = np.where(neutral[:, None] | neutral[None, :], 0.6 + 0.2 * np.nan_to_num(contrast), score)
+    score = np.where(known[:, None] & known[None, :], score, 0.2)
+    score[np.arange(n), np.arange(n)] = 0.0
+    return score
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.argsort(-scores, kind='stable')
+    idx = np.argpartition(-scores, k)[:k]
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+def _beam(sequence, candidates: dict, unary, harmony, beam_width: int, deadline: float):
+    """Beam search over one slot sequence; returns ([(items, score)], truncated)."""
+    # state: (item indices, sum of unary scores, sum of pair harmonies)
+    beam = [((), 0.0, 0.0)]
+    truncated = False
+    for slot in sequence:
+        cand = candidates.get(slot)
+        if cand is None or not len(cand):
+            if slot in OPTIONAL:
+                continue
+            return [], truncated
+        width = beam_width
+        if time.perf_counter() > deadline:
+            width, truncated = 1, True   # out of budget: finish greedily
+        expanded = []
+        for items, u_sum, h_sum in beam:
+            n = len(items) + 1
+            pairs = n * (n - 1) / 2
+            u_new = u_sum + unary[cand]
+            h_new = h_sum + (harmony[list(items)][:, cand].sum(axis=0) if items else np.zeros(len(cand)))
+            scores = u_new / n + (h_new / pairs if pairs else 0.0)
+            for j in _top(scores, width):
+                expanded.append((scores[j], items + (int(cand[j]),), float(u_new[j]), float(h_new[j])))
+            if slot in OPTIONAL:
+                n0 = max(len(items), 1)
+                p0 = n0 * (n0 - 1) / 2
+                expanded.append((u_sum / n0 + (h_sum / p0 if p0 else 0.0), items, u_sum, h_sum))
+        expanded.sort(key=lambda e: -e[0])
+        beam = [(items, u, h) for _, items, u, h in expanded[:width]]
+
+    results = []
+    for items, u_sum, h_sum in beam:
+        n = len(items)
+        if n < 2:
+            continue
+        results.append((items, u_sum / n + h_sum / (n * (n - 1) / 2)))
+    return results, truncated
+
+
+def build_outfits(features: ItemFeatures, limit: int = 5, beam_width: int = 8, per_slot: int = 25,
+                  budget_ms: float = 150.0) -> dict:
+    """Best `limit` outfits as {'outfits': [{'item_ids', 'score'}], 'truncated': bool}.
+
+    Each slot is first pruned to its `per_slot` best items by unary score, so
+    the harmony matrix and the search stay small however big the closet is.
+    """
+    deadline = time.perf_counter() + budget_ms / 1000
+    slots = {s for seq in SEQUENCES for s in seq}
+    by_slot = {}
+    for slot in slots:
+        idx = np.flatnonzero(features.categories == slot)
+        by_slot[slot] = idx[_top(features.unary[idx], per_slot)]
+
+    # work on the pruned pool only: harmony is pool×pool, not closet×closet
+    pool = np.concatenate([by_slot[slot] for slot in sorted(slots)]).astype(int)
+    local = {int(i): n for n, i in enumerate(pool)}
+    candidates = {slot: np.array([local[int(i)] for i in idx], dtype=int) for slot, idx in by_slot.items()}
+    unary = features.unary[pool]
+    harmony = harmony_matrix(features.lab[pool])
+
+    found, truncated = [], False
+    for sequence in SEQUENCES:
+        results, cut = _beam(sequence, candidates, unary, harmony, beam_width, deadline)
+        found.extend(results)
+        truncated |= cut
+    found.sort(key=lambda r: -r[1])
+    return {
+        'outfits': [
+            {'item_ids': [int(features.ids[pool[i]]) for i in items], 'score': round(float(score), 4)}
+            for items, score in found[:limit]
+        ],
+        'truncated': truncated,
+    }
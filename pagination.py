@@ -0,0 +1,111 @@
+"""
+Keyset (cursor) pagination helpers
+Cursors are opaque url-safe tokens holding the sort key of the last row served,
+or for orderings that drift between requests, a frozen snapshot and an offset
+"""
+
+import base64
+import json
+import secrets
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import literal, tuple_
+
+
+class CursorError(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+
+
+def _encode_value(v):
+    if isinstance(v, datetime):
+        return {'dt': v.isoformat()}
+    return v
+
+
+def _decode_value(v):
+    if isinstance(v, dict) and 'dt' in v:
+        return datetime.fromisoformat(v['dt'])
+    return v
+
+
+def encode_cursor(sort: str, values) -> str:
+    raw = json.dumps([sort, [_encode_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, sort: str, arity: int) -> list:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in values]
+    except Exception as exc:
+        raise CursorError('Malformed cursor.') from exc
+    if cursor_sort != sort or len(values) != arity:
+        raise CursorError('Cursor does not match the requested sort.')
+    return values
+
+
+def paginate(query, sort: str, keys, cursor: Optional[str] = None, limit: int = 50,
+             descending: bool = False) -> Page:
+    """Return one page of `query` ordered by `keys` (all ascending or all descending).
+
+    `keys` must end with a unique column (the primary key) so the ordering is
+    total; the page is located with a row-value comparison that the composite
+    (user_id, key..., id) indexes can seek on, so deep pages cost the same as
+    the first one.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort, len(keys))
+        boundary = tuple_(*keys)
+        after = tuple_(*[literal(v, k.type) for k, v in zip(keys, values)])
+        query = query.filter(boundary < after if descending else boundary > after)
+
+    order = [k.desc() if descending else k.asc() for k in keys]
+    rows = query.add_columns(*keys).order_by(None).order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1][1:])
+    return Page([row[0] for row in rows], next_cursor)
+
+
+def paginate_snapshot(query, sort: str, keys, store, cursor: Optional[str] = None, limit: int = 50,
+                      ttl: float = None) -> Page:
+    """Return one page of `query` ordered by `keys` (ascending), frozen at the first page.
+
+    For orderings that move between requests, like bm25 ranks, which shift
+    with every write to the shared index, a keyset cursor could skip or
+    repeat rows. The first page reads the ordered ids (the last key) and, when
+    there is more than one page, keeps them in `store` under a random token;
+    later cursors carry the token and an offset. Rows deleted since drop out.
+    """
+    pk = keys[-1]
+    token = None
+    if cursor:
+        token, offset = decode_cursor(cursor, sort, 2)
+        if not isinstance(token, str) or type(offset) is not int or offset < 0:
+            raise CursorError('Malformed cursor.')
+        ids = store.get(f'page-snapshot:{token}')
+        if ids is None:
+            raise CursorError('Cursor has expired.')
+    else:
+        offset = 0
+        ids = [row[0] for row in query.with_entities(pk).order_by(None).order_by(*[k.asc() for k in keys])]
+
+    page_ids = ids[offset:offset + limit]
+    by_id = {getattr(item, pk.key): item for item in query.filter(pk.in_(page_ids))} if page_ids else {}
+
+    next_cursor = None
+    if len(ids) > offset + limit:
+        if token is None:
+            token = secrets.token_urlsafe(12)
+            store.set(f'page-snapshot:{token}', ids, ttl)
+        next_cursor = encode_cursor(sort, [token, offset + limit])
+    return Page([by_id[i] for i in page_ids if i in by_id], next_cursor)
@@ -0,0 +1,108 @@
+"""
+Password hashing off the request thread
+Hashes and checks run in a bounded process pool so a login burst can't hold
+the GIL; a semaphore caps in-flight work and turns overload into a quick 503
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug's defaults, so 'pbkdf2' and 'pbkdf2:sha256:600000' compare equal
+_DEFAULT_PARAMS = {'pbkdf2': ['sha256', '600000'], 'scrypt': ['32768', '8', '1']}
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the pool is saturated; callers should answer 503 and let the client retry."""
+
+
+def canonical_method(method: str) -> str:
+    name, *params = method.split(':')
+    defaults = _DEFAULT_PARAMS.get(name, [])
+    params = params + defaults[len(params):]
+    return ':'.join([name] + params)
+
+
+def needs_rehash(pwhash: str, method: str) -> bool:
+    stored = pwhash.split('$', 1)[0]
+    return canonical_method(stored) != canonical_method(method)
+
+
+class HashingPool:
+    def __init__(self, workers: int, max_pending: int, wait_timeout: float, inline: bool = False):
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self.inline = inline
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # created on first use so forking servers start their pool after the fork
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def run(self, fn, *args):
+        if self.inline:
+            return fn(*args)
+        if not self.slots.acquire(timeout=self.wait_timeout):
+            self.rejected += 1
+            raise HashingBusy('Password hashing queue is full.')
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # the slot is held until the hash finishes, not until we stop waiting for it,
+        # so jobs abandoned on timeout still count against max_pending
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.wait_timeout * 4)
+        except FutureTimeout as exc:
+            raise HashingBusy('Password hashing timed out.') from exc
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool() -> HashingPool:
+    return current_app.extensions['password_pool']
+
+
+def hash_password(password: str) -> str:
+    cfg = current_app.config
+    return _pool().run(generate_password_hash, password, cfg['PASSWORD_HASH_METHOD'], cfg['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return _pool().run(check_password_hash, pwhash, password)
+
+
+def check_and_upgrade(user, password: str) -> bool:
+    """Verify `password`; on success re-hash with the current policy if the stored hash is outdated.
+
+    The caller commits. Returns whether the password matched.
+    """
+    if not verify_password(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash, current_app.config['PASSWORD_HASH_METHOD']):
+        user.password_hash = hash_password(password)
+    return True
+
+
+def init_app(app) -> None:
+    app.extensions['password_pool'] = HashingPool(
+        workers=app.config['PASSWORD_HASH_WORKERS'] or max(1, (os.cpu_count() or 2) // 2),
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        wait_timeout=app.config['PASSWORD_HASH_WAIT_TIMEOUT'],
+        inline=app.config['PASSWORD_HASH_POOL'] == 'inline',
+    )
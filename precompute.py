@@ -0,0 +1,134 @@
+"""
+Offline recommendation precomputation
+`flask recommendations-precompute` recomputes every user's styler picks and
+colour analysis (season, palette, ranked wardrobe hits) across a process pool
+and bulk-writes them to precomputed_recommendations. A row is tagged with the
+user's data_version and the styling rules fingerprint it was computed from, so
+any later write or rules change makes it stale and the routes fall back to
+computing live. By default only users whose row is missing or stale are redone
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import click
+from sqlalchemy import delete, func, insert, or_, select
+
+from models import db, PrecomputedRecommendation, User, UserProfile
+import rules
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def lookup(user_id: int, view: str):
+    """The user's precomputed `view` result, or None when missing or stale."""
+    row = db.session.execute(
+        select(getattr(PrecomputedRecommendation, view))
+        .join(User, User.id == PrecomputedRecommendation.user_id)
+        .where(PrecomputedRecommendation.user_id == user_id,
+               PrecomputedRecommendation.data_version == func.coalesce(User.data_version, 0),
+               PrecomputedRecommendation.rules_fingerprint == rules.current().fingerprint)
+    ).first()
+    return json.loads(row[0]) if row else None
+
+
+# -----------------------------
+# Computing (worker processes)
+# -----------------------------
+def _init_worker():
+    # connections inherited through fork belong to the parent; the worker opens its own
+    from app import app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def compute_batch(user_ids) -> list:
+    """Result rows for `user_ids`; runs in a worker with its own app context and connections."""
+    from app import app, colour_inputs, colour_recommendations, styler_recommendations
+
+    with app.app_context():
+        # read the version before computing: a write that lands meanwhile leaves the row stale, not wrong
+        versions = dict(db.session.execute(
+            select(User.id, func.coalesce(User.data_version, 0)).where(User.id.in_(user_ids))
+        ).all())
+        profiles = {p.user_id: p for p in UserProfile.query.filter(UserProfile.user_id.in_(versions))}
+        fingerprint = rules.current().fingerprint
+        rows = []
+        for user_id, version in versions.items():
+            profile = profiles.get(user_id) or UserProfile(user_id=user_id)
+            rows.append({
+                'user_id': user_id,
+                'data_version': version,
+                'rules_fingerprint': fingerprint,
+                'styler': json.dumps(styler_recommendations(profile)),
+                'colour': json.dumps(colour_recommendations(user_id, *colour_inputs(profile))),
+                'computed_at': datetime.utcnow(),
+            })
+        db.session.remove()
+        return rows
+
+
+# -----------------------------
+# Batch job
+# -----------------------------
+def pending_users(everyone: bool = False) -> list:
+    stmt = (select(User.id)
+            .outerjoin(PrecomputedRecommendation, PrecomputedRecommendation.user_id == User.id)
+            .order_by(User.id))
+    if not everyone:
+        stmt = stmt.where(or_(
+            PrecomputedRecommendation.user_id.is_(None),
+            PrecomputedRecommendation.data_version != func.coalesce(User.data_version, 0),
+            PrecomputedRecommendation.rules_fingerprint != rules.current().fingerprint,
+        ))
+    return db.session.scalars(stmt).all()
+
+
+def store(rows) -> None:
+    """Replace these users' rows: one DELETE and one multi-row INSERT (the caller commits)."""
+    if not rows:
+        return
+    db.session.execute(delete(PrecomputedRecommendation).where(
+        PrecomputedRecommendation.user_id.in_([r['user_id'] for r in rows])
+    ))
+    db.session.execute(insert(PrecomputedRecommendation), rows)
+
+
+def run(everyone: bool = False, workers: int = 0, batch_size: int = 100, echo=lambda m: None) -> int:
+    """Recompute missing/stale (or all) users; each batch is committed as it completes."""
+    user_ids = pending_users(everyone)
+    batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(batches) <= 1:
+        results = map(compute_batch, batches)
+        pool = None
+    else:
+        db.session.remove()  # nothing checked out across the fork
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(batches)), initializer=_init_worker)
+        results = pool.map(compute_batch, batches)
+    done = 0
+    try:
+        for rows in results:
+            store(rows)
+            db.session.commit()
+            done += len(rows)
+            echo(f'{done}/{len(user_ids)} users precomputed')
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return done
+
+
+def init_app(app) -> None:
+    @app.cli.command('recommendations-precompute')
+    @click.option('--all', 'everyone', is_flag=True, help='Recompute every user, not only missing or stale ones.')
+    @click.option('--workers', type=int, default=0, help='Worker processes (default: one per core).')
+    @click.option('--batch-size', default=100, show_default=True, help='Users per worker task and commit.')
+    def recommendations_precompute_command(everyone, workers, batch_size):
+        """Precompute styler picks and colour analysis for users whose results are missing or stale."""
+        n = run(everyone, workers, batch_size, echo=click.echo)
+        click.echo(f'Precomputed recommendations for {n} users.')
@@ -0,0 +1,232 @@
+"""
+Styling rules
+The undertone/occasion suggestions, palettes, pick keywords and the season
+rules live in styling_rules.json. The file is compiled once into frozen lookup
+tables (every undertone x occasion combination is resolved ahead of time) and
+precompiled matchers, so a request only does dictionary lookups. Edits to the
+file are picked up without a restart: the mtime is checked at most every
+STYLING_RULES_RELOAD seconds and a file that fails to compile is logged and
+ignored, leaving the previous rules in place
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+
+import click
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+_HEX_RE = re.compile(r'^#[0-9a-fA-F]{6}$')
+PALETTE_GROUPS = ('neutrals', 'accents', 'avoid')
+
+
+class RulesError(ValueError):
+    pass
+
+
+class StylerRule(NamedTuple):
+    suggestions: tuple
+    palette: tuple
+    match_words: tuple    # undertone keywords, then occasion keywords
+
+
+class RuleSet(NamedTuple):
+    version: int
+    fingerprint: str      # short hash of the file; part of the recommendation cache keys
+    undertones: tuple
+    occasions: tuple
+    styler: MappingProxyType            # (undertone | None, occasion | None) -> StylerRule
+    occasion_keywords: MappingProxyType  # occasion -> tuple of words
+    seasons: MappingProxyType           # undertone -> (low-contrast season, high-contrast season)
+    palettes: MappingProxyType          # season -> {'neutrals', 'accents', 'avoid'} of tuples
+    light_skin: re.Pattern
+    dark_hair: re.Pattern
+
+    def styler_rule(self, undertone, occasion) -> StylerRule:
+        return self.styler.get((undertone, occasion)) or self.styler[(
+            undertone if undertone in self.undertones else None,
+            occasion if occasion in self.occasions else None,
+        )]
+
+    def season(self, undertone, skin_tone, hair):
+        """Seasonal type from lowercased profile fields (None without a known undertone)."""
+        pair = self.seasons.get(undertone)
+        if pair is None:
+            return None
+        high_contrast = bool(skin_tone and hair and self.light_skin.search(skin_tone)
+                             and self.dark_hair.search(hair))
+        return pair[high_contrast]
+
+    def palette(self, season):
+        """A season's palette as a fresh dict of lists (callers cache it as JSON)."""
+        groups = self.palettes.get(season)
+        return {name: list(hexes) for name, hexes in groups.items()} if groups else None
+
+
+# -----------------------------
+# Compiling
+# -----------------------------
+def _words(value, where: str) -> tuple:
+    if not isinstance(value, list) or not all(isinstance(w, str) and w.strip() for w in value):
+        raise RulesError(f'{where} must be a list of non-empty strings.')
+    return tuple(w.strip() for w in value)
+
+
+def _hexes(value, where: str) -> tuple:
+    hexes = _words(value, where)
+    bad = [h for h in hexes if not _HEX_RE.match(h)]
+    if bad:
+        raise RulesError(f'{where}: not #rrggbb colors: {", ".join(bad)}')
+    return hexes
+
+
+def _matcher(words) -> re.Pattern:
+    # substring semantics, like the `k in text` scans this replaces
+    return re.compile('|'.join(re.escape(w.lower()) for w in sorted(words, key=len, reverse=True)))
+
+
+def compile_rules(raw: bytes) -> RuleSet:
+    try:
+        doc = json.loads(raw)
+        version = int(doc['version'])
+        undertones = doc['undertones']
+        occasions = doc['occasions']
+        contrast = doc['contrast']
+        by_undertone = doc['seasons']['by_undertone']
+        palettes = doc['seasons']['palettes']
+    except (ValueError, TypeError, KeyError) as exc:
+        raise RulesError(f'Malformed rules file: {exc!r}') from exc
+
+    tone_rules = {
+        tone: (_words(r.get('suggestions', []), f'undertones.{tone}.suggestions'),
+               _hexes(r.get('palette', []), f'undertones.{tone}.palette'),
+               _words(r.get('keywords', []), f'undertones.{tone}.keywords'))
+        for tone, r in undertones.items()
+    }
+    occasion_rules = {
+        occ: (_words(r.get('suggestions', []), f'occasions.{occ}.suggestions'),
+              _words(r.get('keywords', []), f'occasions.{occ}.keywords'))
+        for occ, r in occasions.items()
+    }
+
+    styler = {}
+    for tone in (None, *tone_rules):
+        t_sugs, t_palette, t_words = tone_rules.get(tone, ((), (), ()))
+        for occ in (None, *occasion_rules):
+            o_sugs, o_words = occasion_rules.get(occ, ((), ()))
+            styler[(tone, occ)] = StylerRule(t_sugs + o_sugs, t_palette, t_words + o_words)
+
+    compiled_palettes = {}
+    for season, groups in palettes.items():
+        missing = [g for g in PALETTE_GROUPS if g not in groups]
+        if missing:
+            raise RulesError(f'seasons.palettes.{season} is missing {", ".join(missing)}.')
+        compiled_palettes[season] = MappingProxyType(
+            {g: _hexes(groups[g], f'seasons.palettes.{season}.{g}') for g in PALETTE_GROUPS}
+        )
+    seasons = {}
+    for tone, pair in by_undertone.items():
+        low, high = pair.get('low_contrast'), pair.get('high_contrast')
+        for season in (low, high):
+            if season not in compiled_palettes:
+                raise RulesError(f'seasons.by_undertone.{tone} names unknown season {season!r}.')
+        seasons[tone] = (low, high)
+
+    return RuleSet(
+        version=version,
+        fingerprint=hashlib.sha1(raw).hexdigest()[:12],
+        undertones=tuple(tone_rules),
+        occasions=tuple(occasion_rules),
+        styler=MappingProxyType(styler),
+        occasion_keywords=MappingProxyType({occ: r[1] for occ, r in occasion_rules.items()}),
+        seasons=MappingProxyType(seasons),
+        palettes=MappingProxyType(compiled_palettes),
+        light_skin=_matcher(_words(contrast.get('light_skin'), 'contrast.light_skin')),
+        dark_hair=_matcher(_words(contrast.get('dark_hair'), 'contrast.dark_hair')),
+    )
+
+
+def load(path: str) -> RuleSet:
+    with open(path, 'rb') as fh:
+        return compile_rules(fh.read())
+
+
+# -----------------------------
+# Hot reload
+# -----------------------------
+class RuleStore:
+    """The active RuleSet, swapped atomically when the file changes on disk."""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.rules = load(path)
+        self._signature = self._stat()
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> RuleSet:
+        if self.interval and time.monotonic() - self._checked >= self.interval:
+            self.check()
+        return self.rules
+
+    def check(self) -> bool:
+        """Reload if the file changed; returns True when new rules were installed."""
+        if not self._lock.acquire(blocking=False):
+            return False  # another thread is already checking; keep serving the current rules
+        try:
+            self._checked = time.monotonic()
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature  # a broken file is reported once, not on every check
+            try:
+                rules = load(self.path)
+            except Exception:  # a bad edit must never take requests down with it
+                log.exception('Keeping styling rules v%d; %s did not load', self.rules.version, self.path)
+                return False
+            if rules.fingerprint == self.rules.fingerprint:
+                return False
+            self.rules = rules
+            log.info('Loaded styling rules v%d (%s)', rules.version, rules.fingerprint)
+            return True
+        finally:
+            self._lock.release()
+
+
+def current() -> RuleSet:
+    return current_app.extensions['styling_rules'].get()
+
+
+def init_app(app) -> None:
+    store = RuleStore(app.config['STYLING_RULES_PATH'], app.config['STYLING_RULES_RELOAD'])
+    app.extensions['styling_rules'] = store
+    # cached recommendations are only valid for the rules that produced them
+    app.extensions['recommendation_cache'].key_suffix = lambda: store.get().fingerprint
+
+    @app.cli.command('rules-check')
+    @click.argument('path', required=False)
+    def rules_check_command(path):
+        """Compile a styling rules file (default: the configured one) and report errors."""
+        path = path or app.config['STYLING_RULES_PATH']
+        try:
+            rules = load(path)
+        except (OSError, RulesError, AttributeError, TypeError) as exc:
+            raise click.ClickException(f'{exc.__class__.__name__}: {exc}')
+        click.echo(f'{path}: v{rules.version} ({rules.fingerprint}), {len(rules.undertones)} undertones, '
+                   f'{len(rules.occasions)} occasions, {len(rules.palettes)} seasons.')
@@ -0,0 +1,228 @@
+"""
+Route-level benchmark
+Seeds a throwaway database, drives the main routes through the Flask test
+client and reports p50/p95/p99 latency, throughput and SQL statements per
+request. Each route is timed cold (recommendation, fragment and user caches
+cleared before every request) and warm (after warm-up requests). Results are
+written as JSON (by default next to the throwaway database) so runs can be
+compared across commits
+
+    python scripts/benchmark.py --users 20 --items 500 --out bench.json
+    python scripts/benchmark.py --compare bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed_database import COLORS, SEED_PASSWORD, seed  # noqa: E402
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+def png_bytes(rng: random.Random) -> bytes:
+    """A small unique PNG so every upload is a new blob (no dedup shortcut)."""
+    from PIL import Image
+
+    im = Image.new('RGB', (96, 96), tuple(rng.randrange(256) for _ in range(3)))
+    im.putpixel((rng.randrange(96), rng.randrange(96)), (rng.randrange(256), 0, 0))
+    buf = io.BytesIO()
+    im.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def scenarios(rng: random.Random, email: str) -> dict:
+    """name -> callable(client) returning a response; each call is one timed request."""
+    words = ['shirt', 'blue', 'denim', 'silk', 'dress', 'cotton jeans', 'formal', 'olive']
+    categories = ['Top', 'Bottom', 'Dress', 'Outerwear', 'Footwear', 'Accessory']
+
+    def upload(c):
+        data = {
+            'name': f'bench upload {rng.randrange(10 ** 6)}', 'category': rng.choice(categories),
+            'color': rng.choice(COLORS), 'image': (io.BytesIO(png_bytes(rng)), 'bench.png'),
+        }
+        return c.post('/wardrobe', data=data, content_type='multipart/form-data')
+
+    return {
+        'wardrobe_newest': lambda c: c.get('/wardrobe?sort=newest'),
+        'wardrobe_name': lambda c: c.get('/wardrobe?sort=name'),
+        'wardrobe_search': lambda c: c.get(f'/wardrobe?q={rng.choice(words)}'),
+        'wardrobe_filter': lambda c: c.get(f'/wardrobe?category={rng.choice(categories)}&sort=name'),
+        'api_wardrobe': lambda c: c.get('/api/wardrobe?limit=50'),
+        'personal_styler': lambda c: c.get('/personal-styler'),
+        'colour_analysis': lambda c: c.get('/colour-analysis'),
+        'login': lambda c: c.post('/login', data={'email': email, 'password': SEED_PASSWORD}),
+        'upload': upload,
+    }
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+class QueryCounter:
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def clear_caches(app) -> None:
+    """Empty every application cache so the next request computes from the database."""
+    import cache
+
+    with app.app_context():
+        cache.recommendations().backend.clear()
+        cache.fragments().backend.clear()
+        cache.users().backend.clear()
+
+
+def run_scenario(client, fn, counter: QueryCounter, iterations: int, warmup: int, reset=None) -> dict:
+    """Time `iterations` calls of fn; `reset` (untimed) runs before each of them."""
+    for _ in range(warmup):
+        fn(client)
+    timings, queries, errors = [], [], 0
+    elapsed = 0.0
+    for _ in range(iterations):
+        if reset is not None:
+            reset()
+        before = counter.count
+        t0 = time.perf_counter()
+        response = fn(client)
+        took = time.perf_counter() - t0
+        elapsed += took
+        timings.append(took * 1000)
+        queries.append(counter.count - before)
+        if response.status_code >= 400:
+            errors += 1
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'throughput_rps': round(iterations / elapsed, 2) if elapsed else 0.0,
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\nvs {baseline.get('revision', '?')} ({baseline.get('timestamp', '?')})")
+    for phase, results in current['results'].items():
+        for name, result in results.items():
+            old = baseline.get('results', {}).get(phase, {}).get(name)
+            if not old:
+                continue
+            delta = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            print(f"  {phase:<5} {name:<18} p95 {old['p95_ms']:>9.2f} -> {result['p95_ms']:>9.2f} ms "
+                  f"({delta:+.1f}%)  queries {old['queries_per_request']:.1f} -> {result['queries_per_request']:.1f}")
+
+
+def print_table(phase: str, results: dict) -> None:
+    print(f"\n{phase}")
+    print(f"{'scenario':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['throughput_rps']:>9.1f} {r['queries_per_request']:>8.1f} {r['errors']:>7}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--items', type=int, default=300, help='Wardrobe items per user')
+    parser.add_argument('--profiles', type=float, default=0.8)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', action='append', help='Run just these scenarios (repeatable)')
+    parser.add_argument('--out', help='Write JSON results here (default: <revision>.json in the work directory)')
+    parser.add_argument('--compare', help='Baseline JSON to diff p95/queries against')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='glamdiva-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ.setdefault('IMAGE_PROCESSING', 'inline')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from migrations import upgrade
+    from models import db
+
+    with app.app_context():
+        upgrade()
+        t0 = time.perf_counter()
+        emails = seed(args.users, args.items, args.profiles, args.seed)
+        print(f'Seeded {args.users} users x {args.items} items in {time.perf_counter() - t0:.1f}s ({workdir})')
+        counter = QueryCounter(db.engines.values())
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    login = client.post('/login', data={'email': emails[0], 'password': SEED_PASSWORD})
+    if login.status_code != 302:
+        sys.exit(f'Could not log in as {emails[0]} (HTTP {login.status_code}).')
+
+    results = {'cold': {}, 'warm': {}}
+    for name, fn in scenarios(rng, emails[0]).items():
+        if args.only and name not in args.only:
+            continue
+        results['cold'][name] = run_scenario(client, fn, counter, args.iterations, 0,
+                                             reset=lambda: clear_caches(app))
+        results['warm'][name] = run_scenario(client, fn, counter, args.iterations, args.warmup)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': sys.version.split()[0],
+        'params': {k: getattr(args, k) for k in ('users', 'items', 'profiles', 'iterations', 'warmup', 'seed')},
+        'results': results,
+    }
+    for phase, phase_results in results.items():
+        print_table(phase, phase_results)
+
+    out = args.out or os.path.join(workdir, f"{report['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print(f'\nWrote {out}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
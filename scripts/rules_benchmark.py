@@ -0,0 +1,206 @@
+"""
+Styling rules benchmark
+Times the per-request cost of evaluating the styler and colour-analysis rules:
+the compiled RuleSet lookups against the original per-request dict literals
+and substring scans (kept below as the reference). Both are first checked to
+give identical answers for every profile combination. No database involved
+
+    python scripts/rules_benchmark.py --iterations 200000
+    python scripts/rules_benchmark.py --rules my_rules.json --out rules-bench.json
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rules  # noqa: E402
+from seed_database import HAIR, OCCASIONS, SKIN_TONES, UNDERTONES  # noqa: E402
+
+
+# -----------------------------
+# Reference: the rules as they were evaluated before styling_rules.json
+# -----------------------------
+def legacy_styler(undertone, occasion):
+    undertone_map = {
+        'cool': ['jewel tones', 'blue', 'emerald', 'amethyst', 'cool gray', 'crisp white'],
+        'warm': ['earth tones', 'olive', 'mustard', 'rust', 'camel', 'ivory'],
+        'neutral': ['soft pastels', 'taupe', 'peach', 'mauve', 'balanced grays', 'off-white'],
+        None: []
+    }
+    occasion_map = {
+        'work': ['navy', 'charcoal', 'white', 'muted blue'],
+        'casual': ['denim', 'olive', 'beige', 'white'],
+        'party': ['metallic', 'deep red', 'emerald', 'black'],
+        'wedding': ['pastel', 'champagne', 'ivory', 'soft pink'],
+        'festive': ['gold', 'maroon', 'royal blue', 'bottle green'],
+        'sports': ['black', 'electric blue', 'neon accents'],
+        'custom': []
+    }
+    occasion_keywords = {
+        'work': ['blazer', 'shirt', 'trouser', 'formal', 'office'],
+        'casual': ['tee', 't-shirt', 'jeans', 'hoodie', 'sneaker', 'casual'],
+        'party': ['sequin', 'dress', 'bodycon', 'heels', 'party'],
+        'wedding': ['sherwani', 'lehenga', 'sari', 'gown', 'pastel', 'wedding'],
+        'festive': ['kurta', 'ethnic', 'embroidery', 'gold', 'festive'],
+        'sports': ['track', 'jersey', 'shorts', 'sweat', 'sport'],
+        'custom': []
+    }
+    suggestions = undertone_map.get(undertone, []) + (occasion_map.get(occasion, []) if occasion else [])
+    palette_map = {
+        'cool': ['#0f52ba', '#50c7f2', '#6a0dad', '#2f4f4f', '#ffffff'],
+        'warm': ['#b5651d', '#c19a6b', '#556b2f', '#8b4513', '#fffff0'],
+        'neutral': ['#e6e0d4', '#d8bfd8', '#f5deb3', '#708090', '#f8f8ff'],
+        None: []
+    }
+    palette = palette_map.get(undertone, [])
+    keywords = {
+        'cool': ['blue', 'navy', 'emerald', 'purple', 'amethyst', 'grey', 'gray', 'white'],
+        'warm': ['brown', 'tan', 'beige', 'mustard', 'olive', 'rust', 'camel', 'ivory'],
+        'neutral': ['taupe', 'peach', 'mauve', 'pastel', 'gray', 'grey', 'off-white']
+    }
+    match_words = keywords.get(undertone, [])[:]
+    if occasion:
+        match_words += occasion_keywords.get(occasion, [])
+    return suggestions, palette, match_words
+
+
+def legacy_colour(ut, st, hair_c):
+    def season_from():
+        if not ut:
+            return None
+        high_contrast = False
+        if st and hair_c:
+            light_skin = any(k in st for k in ['very fair', 'fair', 'light', 'light-medium'])
+            dark_hair = any(k in hair_c for k in ['black', 'dark', 'deep'])
+            high_contrast = light_skin and dark_hair
+        if ut == 'cool':
+            return 'Winter' if high_contrast else 'Summer'
+        if ut == 'warm':
+            return 'Spring' if high_contrast else 'Autumn'
+        if ut == 'neutral':
+            return 'Winter' if high_contrast else 'Autumn'
+        return None
+
+    season = season_from()
+    palettes = {
+        'Winter': {'neutrals': ['#000000', '#2F4F4F', '#FFFFFF', '#C0C0C0'],
+                   'accents': ['#0F52BA', '#228B22', '#800080', '#DC143C'],
+                   'avoid': ['#C19A6B', '#DAA520', '#8B4513']},
+        'Summer': {'neutrals': ['#708090', '#D3D3D3', '#F8F8FF', '#C0C0C0'],
+                   'accents': ['#87CEFA', '#6A5ACD', '#3CB371', '#DB7093'],
+                   'avoid': ['#8B4513', '#B5651D', '#FF8C00']},
+        'Spring': {'neutrals': ['#FFF8DC', '#F5F5DC', '#C19A6B', '#8B4513'],
+                   'accents': ['#FFD700', '#FF8C00', '#32CD32', '#FF69B4'],
+                   'avoid': ['#808080', '#4B0082', '#2F4F4F']},
+        'Autumn': {'neutrals': ['#8B4513', '#654321', '#C19A6B', '#F5DEB3'],
+                   'accents': ['#556B2F', '#B8860B', '#A0522D', '#CD5C5C'],
+                   'avoid': ['#FFFFFF', '#ADD8E6', '#9370DB']},
+    }
+    return season, palettes.get(season, None)
+
+
+def compiled_styler(ruleset, undertone, occasion):
+    rule = ruleset.styler_rule(undertone, occasion)
+    return list(rule.suggestions), list(rule.palette), list(rule.match_words)
+
+
+def compiled_colour(ruleset, ut, st, hair_c):
+    season = ruleset.season(ut, st, hair_c)
+    return season, ruleset.palette(season)
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def profiles():
+    """Every combination the forms and seeder can produce, plus blanks."""
+    return list(itertools.product([None, *UNDERTONES], [None, *OCCASIONS], [None, *SKIN_TONES],
+                                  [None, *(h.lower() for h in HAIR)]))
+
+
+def check_equivalent(ruleset, combos) -> None:
+    for ut, occ, st, hair in combos:
+        if legacy_styler(ut, occ) != compiled_styler(ruleset, ut, occ):
+            sys.exit(f'Styler rules differ for undertone={ut!r} occasion={occ!r}')
+        if legacy_colour(ut, st, hair) != compiled_colour(ruleset, ut, st, hair):
+            sys.exit(f'Colour rules differ for undertone={ut!r} skin={st!r} hair={hair!r}')
+
+
+def time_per_call(fn, inputs, iterations: int) -> float:
+    """Mean nanoseconds per call over `iterations` calls cycling through `inputs`."""
+    calls = [inputs[i % len(inputs)] for i in range(iterations)]
+    t0 = time.perf_counter_ns()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter_ns() - t0) / iterations
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rules', default=os.path.join(ROOT, 'styling_rules.json'))
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='Write JSON results here')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    ruleset = rules.load(args.rules)
+    compile_ms = (time.perf_counter() - t0) * 1000
+
+    combos = profiles()
+    if os.path.samefile(args.rules, os.path.join(ROOT, 'styling_rules.json')):
+        check_equivalent(ruleset, combos)
+        print(f'Compiled rules match the reference for {len(combos)} profiles.')
+    random.Random(args.seed).shuffle(combos)
+    styler_in = [(ut, occ) for ut, occ, _, _ in combos]
+    colour_in = [(ut, st, hair) for ut, _, st, hair in combos]
+
+    # hot-reload bookkeeping: interval 0 never stats, a due check costs one stat()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'rules.json')
+        with open(args.rules, 'rb') as src, open(path, 'wb') as dst:
+            dst.write(src.read())
+        idle, due = rules.RuleStore(path, 0), rules.RuleStore(path, 1e-9)
+        lookup_ns = time_per_call(idle.get, [()], args.iterations)
+        check_ns = time_per_call(due.get, [()], args.iterations)
+
+    results = {
+        'styler_legacy_ns': time_per_call(legacy_styler, styler_in, args.iterations),
+        'styler_compiled_ns': time_per_call(functools.partial(compiled_styler, ruleset), styler_in,
+                                            args.iterations),
+        'colour_legacy_ns': time_per_call(legacy_colour, colour_in, args.iterations),
+        'colour_compiled_ns': time_per_call(functools.partial(compiled_colour, ruleset), colour_in,
+                                            args.iterations),
+        'store_get_ns': lookup_ns,
+        'store_get_with_stat_ns': check_ns,
+    }
+    results = {k: round(v, 1) for k, v in results.items()}
+
+    print(f'Compiled {args.rules} (v{ruleset.version}, {ruleset.fingerprint}) in {compile_ms:.2f} ms')
+    print(f"{'evaluation':<12} {'legacy ns':>11} {'compiled ns':>12} {'speedup':>8}")
+    for name in ('styler', 'colour'):
+        old, new = results[f'{name}_legacy_ns'], results[f'{name}_compiled_ns']
+        print(f'{name:<12} {old:>11.1f} {new:>12.1f} {old / new:>7.1f}x')
+    print(f"rules.current(): {results['store_get_ns']:.1f} ns, "
+          f"{results['store_get_with_stat_ns']:.1f} ns when a reload check is due")
+
+    if args.out:
+        report = {'rules': args.rules, 'version': ruleset.version, 'fingerprint': ruleset.fingerprint,
+                  'iterations': args.iterations, 'compile_ms': round(compile_ms, 3), 'results': results}
+        with open(args.out, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f'Wrote {args.out}')
+
+
+if __name__ == '__main__':
+    main()
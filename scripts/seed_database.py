@@ -0,0 +1,133 @@
+"""
+Synthetic data generator
+Seeds users x wardrobe items x styler profiles with realistic names, colors,
+categories and notes. Inserts go through the ORM so tags, canonical colors and
+the search index are built exactly as they are for real uploads
+
+    python scripts/seed_database.py --database sqlite:///bench.db --users 50 --items 200
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED_PASSWORD = 'bench-pass-123'
+
+COLORS = [
+    'black', 'charcoal', 'navy', 'royal blue', 'sky blue', 'light blue', 'denim', 'white', 'off-white',
+    'ivory', 'cream', 'beige', 'camel', 'tan', 'brown', 'chocolate', 'rust', 'terracotta', 'mustard',
+    'olive', 'bottle green', 'emerald', 'mint', 'teal', 'burgundy', 'maroon', 'deep red', 'coral',
+    'blush', 'dusty rose', 'lavender', 'purple', 'grey', 'heather grey', 'gold', 'silver', '#1f3a5f',
+    'rgb(200, 120, 90)',
+]
+CATALOG = {
+    'Top': ['t-shirt', 'tee', 'shirt', 'oxford shirt', 'blouse', 'hoodie', 'sweater', 'kurta', 'jersey', 'tank top'],
+    'Bottom': ['jeans', 'chinos', 'trouser', 'shorts', 'skirt', 'track pants', 'cargo pants', 'leggings'],
+    'Dress': ['dress', 'bodycon dress', 'gown', 'lehenga', 'sari', 'maxi dress', 'sequin dress'],
+    'Outerwear': ['blazer', 'denim jacket', 'trench coat', 'bomber', 'puffer', 'cardigan', 'sherwani'],
+    'Footwear': ['sneakers', 'heels', 'loafers', 'boots', 'sandals', 'juttis', 'running shoes'],
+    'Accessory': ['scarf', 'belt', 'watch', 'tote bag', 'earrings', 'cap', 'sunglasses'],
+}
+FABRICS = ['cotton', 'linen', 'silk', 'wool', 'denim', 'satin', 'chiffon', 'leather', 'velvet', 'polyester']
+NOTES = [
+    'bought for {occasion}', 'great for {occasion} days', '{fabric}, fits slightly loose',
+    'pairs well with {color}', 'needs dry cleaning', 'gift from a friend', '{fabric} blend, runs small',
+    'embroidery on the cuffs', 'formal office wear', 'casual weekend favourite', '',
+]
+OCCASIONS = ['work', 'casual', 'party', 'wedding', 'festive', 'sports', 'custom']
+SKIN_TONES = ['very fair', 'fair', 'light', 'medium', 'olive', 'tan', 'deep']
+UNDERTONES = ['cool', 'warm', 'neutral']
+EYES = ['brown', 'dark brown', 'hazel', 'green', 'blue', 'grey', 'black']
+HAIR = ['black', 'dark brown', 'brown', 'blonde', 'red', 'grey', 'auburn']
+
+
+def fake_item(rng: random.Random, user_id: int, created_at: datetime):
+    from models import WardrobeItem
+
+    category = rng.choice(list(CATALOG))
+    color = rng.choice(COLORS)
+    fabric = rng.choice(FABRICS)
+    name = f'{color} {fabric} {rng.choice(CATALOG[category])}' if rng.random() < 0.6 else \
+        f'{color} {rng.choice(CATALOG[category])}'
+    note = rng.choice(NOTES).format(occasion=rng.choice(OCCASIONS), fabric=fabric, color=rng.choice(COLORS))
+    return WardrobeItem(
+        user_id=user_id, name=name[:120], category=category,
+        color=color if rng.random() < 0.9 else None, notes=note or None, created_at=created_at,
+    )
+
+
+def fake_profile(rng: random.Random, user_id: int):
+    from models import UserProfile
+
+    return UserProfile(
+        user_id=user_id, skin_tone=rng.choice(SKIN_TONES), undertone=rng.choice(UNDERTONES),
+        eye_color=rng.choice(EYES), hair_color=rng.choice(HAIR), occasion=rng.choice(OCCASIONS),
+    )
+
+
+def seed(users: int = 10, items: int = 100, profiles: float = 0.8, seed_value: int = 42,
+         email_domain: str = 'bench.glamdiva.dev', chunk_size: int = 1000) -> list:
+    """Create `users` users with `items` items each; returns the new users' emails.
+
+    Must run inside an app context. Every seeded user shares one password hash
+    (SEED_PASSWORD) so seeding isn't dominated by key stretching.
+    """
+    from models import db, User
+    from passwords import hash_password
+
+    rng = random.Random(seed_value)
+    password_hash = hash_password(SEED_PASSWORD)
+    start = datetime.utcnow() - timedelta(days=365)
+    emails = []
+    # re-seeding the same database appends users instead of colliding on email
+    offset = User.query.filter(User.email.like(f'%@{email_domain}')).count()
+
+    for n in range(offset, offset + users):
+        email = f'user{n}@{email_domain}'
+        user = User(name=f'Bench User {n}', email=email, password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        if rng.random() < profiles:
+            db.session.add(fake_profile(rng, user.id))
+        pending = []
+        for _ in range(items):
+            created = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            pending.append(fake_item(rng, user.id, created))
+            if len(pending) >= chunk_size:
+                db.session.add_all(pending)
+                db.session.flush()
+                pending.clear()
+        db.session.add_all(pending)
+        db.session.commit()
+        emails.append(email)
+    return emails
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', help='SQLAlchemy URL (defaults to DATABASE_URL / the app default)')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--items', type=int, default=100, help='Wardrobe items per user')
+    parser.add_argument('--profiles', type=float, default=0.8, help='Fraction of users with a styler profile')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    os.environ.setdefault('PASSWORD_HASH_POOL', 'inline')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from migrations import upgrade
+
+    with app.app_context():
+        upgrade()
+        emails = seed(args.users, args.items, args.profiles, args.seed)
+    print(f'Seeded {len(emails)} users x {args.items} items (password: {SEED_PASSWORD}).')
+
+
+if __name__ == '__main__':
+    main()
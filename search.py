@@ -0,0 +1,246 @@
+"""
+Full-text search over wardrobe items
+SQLite FTS5 index with a pluggable backend registry; LIKE fallback elsewhere
+"""
+
+import re
+import sqlite3
+from contextlib import closing
+
+import click
+from flask import current_app
+from sqlalchemy import bindparam, event, literal, or_, select, text
+from sqlalchemy.engine import make_url
+
+from models import db, WardrobeItem
+
+FTS_TABLE = 'wardrobe_items_fts'
+INDEXED_FIELDS = ('name', 'notes', 'color', 'category')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(q: str) -> list:
+    return [t.lower() for t in _TOKEN_RE.findall(q or '')]
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class SearchBackend:
+    """Interface every search backend implements.
+
+    `matches()` returns a selectable with `item_id` and `rank` columns
+    (lower rank = better match) that callers join against WardrobeItem.
+    """
+    name = None
+
+    def create(self, connection) -> bool:
+        return False
+
+    def index(self, connection, item) -> None:
+        pass
+
+    def remove(self, connection, item_id: int) -> None:
+        pass
+
+    def index_many(self, connection, items) -> None:
+        for item in items:
+            self.index(connection, item)
+
+    def remove_many(self, connection, item_ids) -> None:
+        for item_id in item_ids:
+            self.remove(connection, item_id)
+
+    def clear(self, connection) -> None:
+        pass
+
+    def matches(self, user_id: int, q: str):
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """Portable fallback: every term must appear in one of the indexed fields."""
+    name = 'like'
+
+    def matches(self, user_id: int, q: str):
+        terms = tokenize(q)
+        stmt = select(WardrobeItem.id.label('item_id'), literal(0.0).label('rank')).where(
+            WardrobeItem.user_id == user_id
+        )
+        for term in terms:
+            like = f'%{term}%'
+            stmt = stmt.where(or_(*[getattr(WardrobeItem, f).ilike(like) for f in INDEXED_FIELDS]))
+        return stmt.subquery('search_matches')
+
+
+class SqliteFtsBackend(SearchBackend):
+    """FTS5 virtual table keyed by wardrobe item id (rowid).
+
+    The owner column holds a `u<user id>` token that every query ANDs in, so a
+    match walks that user's postings instead of filtering every user's hits.
+    """
+    name = 'fts5'
+
+    # bm25 column weights: name, notes, color, category, owner (scope only, never ranks)
+    WEIGHTS = (10.0, 2.0, 5.0, 3.0, 0.0)
+
+    def create(self, connection) -> bool:
+        columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({FTS_TABLE})"))]
+        if 'owner' in columns:
+            return False
+        if columns:  # the first schema kept user_id UNINDEXED and filtered after matching
+            connection.execute(text(f"DROP TABLE {FTS_TABLE}"))
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"{', '.join(INDEXED_FIELDS)}, owner, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        return True
+
+    _UPSERT = text(
+        f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, notes, color, category, owner) "
+        f"VALUES (:id, :name, :notes, :color, :category, :owner)"
+    )
+
+    @staticmethod
+    def _params(item) -> dict:
+        return {
+            'id': item.id,
+            'name': item.name or '',
+            'notes': item.notes or '',
+            'color': item.color or '',
+            'category': item.category or '',
+            'owner': f'u{item.user_id}',
+        }
+
+    def index(self, connection, item) -> None:
+        connection.execute(self._UPSERT, self._params(item))
+
+    def index_many(self, connection, items) -> None:
+        params = [self._params(item) for item in items]
+        if params:
+            connection.execute(self._UPSERT, params)
+
+    def remove(self, connection, item_id: int) -> None:
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': item_id})
+
+    def remove_many(self, connection, item_ids) -> None:
+        if item_ids:
+            connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids")
+                               .bindparams(bindparam('ids', expanding=True)), {'ids': list(item_ids)})
+
+    def clear(self, connection) -> None:
+        connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    @staticmethod
+    def to_match(q: str, user_id: int) -> str:
+        # Quote every term so user input can't inject FTS syntax; the trailing *
+        # gives prefix matching and adjacent terms are implicitly AND-ed. Terms
+        # are limited to the item fields so they can never hit the owner token.
+        terms = ' '.join(f'"{t}"*' for t in tokenize(q))
+        return f'owner : "u{int(user_id)}" AND {{{" ".join(INDEXED_FIELDS)}}} : ({terms})'
+
+    def matches(self, user_id: int, q: str):
+        weights = ', '.join(str(w) for w in self.WEIGHTS)
+        return text(
+            f"SELECT rowid AS item_id, bm25({FTS_TABLE}, {weights}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=self.to_match(q, user_id)).columns(
+            item_id=db.Integer, rank=db.Float
+        ).subquery('search_matches')
+
+
+BACKENDS = {
+    LikeSearchBackend.name: LikeSearchBackend,
+    SqliteFtsBackend.name: SqliteFtsBackend,
+}
+
+
+def register_backend(cls) -> None:
+    BACKENDS[cls.name] = cls
+
+
+def _sqlite_has_fts5() -> bool:
+    # probe the linked SQLite library in memory so choosing a backend never touches the database
+    try:
+        with closing(sqlite3.connect(':memory:')) as conn:
+            return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+    except sqlite3.Error:
+        return False
+
+
+def _choose_backend(app) -> SearchBackend:
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        sqlite = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite'
+        name = 'fts5' if sqlite and _sqlite_has_fts5() else 'like'
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown SEARCH_BACKEND {name!r}. Available: {", ".join(sorted(BACKENDS))}')
+    return BACKENDS[name]()
+
+
+def get_backend() -> SearchBackend:
+    return current_app.extensions['wardrobe_search']
+
+
+# -----------------------------
+# Public helpers
+# -----------------------------
+def search_matches(user_id: int, q: str):
+    """Selectable of (item_id, rank) for `q`, or None when q has no usable terms."""
+    if not tokenize(q):
+        return None
+    return get_backend().matches(user_id, q)
+
+
+def reindex(batch_size: int = 500) -> int:
+    backend = get_backend()
+    conn = db.session.connection()
+    backend.clear(conn)
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(WardrobeItem).where(WardrobeItem.id > last_id)
+            .order_by(WardrobeItem.id).limit(batch_size)
+        ).scalars().all()
+        if not batch:
+            break
+        for item in batch:
+            backend.index(conn, item)
+        count += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    db.session.commit()
+    return count
+
+
+# -----------------------------
+# Index sync (runs inside the flush of the writing transaction)
+# -----------------------------
+@event.listens_for(WardrobeItem, 'after_insert')
+@event.listens_for(WardrobeItem, 'after_update')
+def _index_item(mapper, connection, target):
+    backend = current_app.extensions.get('wardrobe_search')
+    if backend is not None:
+        backend.index(connection, target)
+
+
+@event.listens_for(WardrobeItem, 'after_delete')
+def _remove_item(mapper, connection, target):
+    backend = current_app.extensions.get('wardrobe_search')
+    if backend is not None:
+        backend.remove(connection, target.id)
+
+
+def init_app(app) -> None:
+    backend = _choose_backend(app)
+    app.extensions['wardrobe_search'] = backend
+
+    @app.cli.command('search-reindex')
+    @click.option('--batch-size', default=500, show_default=True)
+    def search_reindex_command(batch_size):
+        """Rebuild the wardrobe full-text index from existing rows."""
+        n = reindex(batch_size)
+        click.echo(f'Indexed {n} wardrobe items ({get_backend().name}).')
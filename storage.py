@@ -0,0 +1,199 @@
+"""
+Content-addressed upload storage
+Uploads are hashed while they stream to disk and stored once as <sha256><ext>;
+UploadBlob.ref_count tracks how many wardrobe items point at each file. Files
+enter and leave the store only after the transaction that references or
+releases them commits, so a rollback never strands a file or a row
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app, send_from_directory
+from sqlalchemy import bindparam, delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, UploadBlob
+from images import VARIANTS
+
+CHUNK_SIZE = 64 * 1024
+MEDIA_PREFIX = '/media/'
+ONE_YEAR = 365 * 24 * 3600
+
+_BLOB_RE = re.compile(r'^[0-9a-f]{64}(?:_[a-z]+)?\.[a-z0-9]+$')
+
+
+def _folder() -> str:
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def blob_url(sha: str, ext: str) -> str:
+    return f'{MEDIA_PREFIX}{sha}{ext}'
+
+
+def save_upload(file) -> tuple:
+    """Stream a Werkzeug FileStorage into the store; returns (sha256, url).
+
+    The digest is computed on the same pass that writes the temp file, so the
+    upload is read exactly once. Identical content reuses the existing blob.
+    """
+    ext = os.path.splitext(file.filename or '')[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(_folder(), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=_folder(), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha = digest.hexdigest()
+        return sha, adopt_file(tmp_path, sha, ext, size)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _insert_blob(conn, row: dict) -> bool:
+    """Insert a blob row unless one exists (a concurrent upload of the same content); True if inserted."""
+    table = UploadBlob.__table__
+    if conn.dialect.name in ('sqlite', 'postgresql'):
+        if conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        return conn.execute(insert(table).on_conflict_do_nothing(index_elements=[table.c.sha256]), row).rowcount > 0
+    try:
+        with conn.begin_nested():
+            conn.execute(table.insert(), row)
+        return True
+    except IntegrityError:
+        return False
+
+
+def adopt_file(tmp_path: str, sha: str, ext: str, size: int) -> str:
+    """Take a reference to `sha` for a fully written temp file; the file enters the store on commit.
+
+    Until then it waits under a staging name (see local_path()); a rollback deletes it.
+    """
+    conn = db.session.connection()
+    if not _insert_blob(conn, {'sha256': sha, 'ext': ext, 'size': size, 'ref_count': 1}):
+        acquire(sha)
+        ext = conn.scalar(select(UploadBlob.ext).where(UploadBlob.sha256 == sha))
+    name = f'{sha}{ext}'
+    staged = db.session.info.setdefault('adopt_blobs', {})
+    if name in staged:
+        os.remove(tmp_path)  # the same content twice in one transaction
+    else:
+        fd, staged[name] = tempfile.mkstemp(dir=_folder(), prefix='.adopt-', suffix=ext)
+        os.close(fd)
+        os.replace(tmp_path, staged[name])
+    return blob_url(sha, ext)
+
+
+def local_path(url: str) -> str:
+    """Filesystem path of a stored file, including one adopted by the still-open transaction."""
+    name = os.path.basename(url)
+    return db.session.info.get('adopt_blobs', {}).get(name) or os.path.join(_folder(), name)
+
+
+def acquire(sha: str) -> None:
+    db.session.execute(
+        update(UploadBlob).where(UploadBlob.sha256 == sha).values(ref_count=UploadBlob.ref_count + 1)
+    )
+
+
+def release(sha: str) -> None:
+    """Drop one reference; the file (and its variants) goes once the transaction commits at zero."""
+    if not sha:
+        return
+    db.session.execute(
+        update(UploadBlob).where(UploadBlob.sha256 == sha).values(ref_count=UploadBlob.ref_count - 1)
+    )
+    row = db.session.execute(
+        select(UploadBlob.ref_count, UploadBlob.ext).where(UploadBlob.sha256 == sha)
+    ).first()
+    if row is not None and row.ref_count <= 0:
+        db.session.execute(delete(UploadBlob).where(UploadBlob.sha256 == sha, UploadBlob.ref_count <= 0))
+        db.session.info.setdefault('purge_blobs', {})[sha] = row.ext
+
+
+def release_many(counts) -> None:
+    """release() for {sha: references dropped}, in a fixed number of statements."""
+    counts = {sha: n for sha, n in counts.items() if sha and n}
+    if not counts:
+        return
+    table = UploadBlob.__table__
+    conn = db.session.connection()
+    conn.execute(
+        update(table).where(table.c.sha256 == bindparam('sha')).values(ref_count=table.c.ref_count - bindparam('n')),
+        [{'sha': sha, 'n': n} for sha, n in counts.items()],
+    )
+    dead = conn.execute(
+        select(table.c.sha256, table.c.ext).where(table.c.sha256.in_(counts), table.c.ref_count <= 0)
+    ).all()
+    if dead:
+        conn.execute(delete(table).where(table.c.sha256.in_([r.sha256 for r in dead]), table.c.ref_count <= 0))
+        db.session.info.setdefault('purge_blobs', {}).update((r.sha256, r.ext) for r in dead)
+
+
+def blob_files(sha: str, ext: str, folder: str) -> list:
+    names = [f'{sha}{ext}'] + [f'{sha}{suffix}' for suffix, _ in VARIANTS.values()]
+    return [os.path.join(folder, n) for n in names]
+
+
+@event.listens_for(Session, 'after_commit')
+def _adopt_after_commit(session):
+    adopted = session.info.pop('adopt_blobs', None)
+    for name, staged in (adopted or {}).items():
+        final_path = os.path.join(os.path.dirname(staged), name)
+        if os.path.exists(final_path):
+            os.remove(staged)  # already stored by an earlier upload of the same content
+        else:
+            os.replace(staged, final_path)
+
+
+@event.listens_for(Session, 'after_commit')
+def _purge_after_commit(session):
+    purge = session.info.pop('purge_blobs', None)
+    if not purge:
+        return
+    folder = current_app.config['UPLOAD_FOLDER']
+    with db.engine.connect() as conn:
+        # re-uploaded by someone else since we released it
+        revived = set(conn.scalars(select(UploadBlob.sha256).where(UploadBlob.sha256.in_(purge))))
+    for sha, ext in purge.items():
+        if sha in revived:
+            continue
+        for path in blob_files(sha, ext, folder):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_purges(session):
+    session.info.pop('purge_blobs', None)
+    for staged in session.info.pop('adopt_blobs', {}).values():
+        try:
+            os.remove(staged)
+        except FileNotFoundError:
+            pass
+
+
+def serve(filename: str):
+    m = _BLOB_RE.match(filename)
+    if not m:
+        return 'Not found', 404
+    response = send_from_directory(_folder(), filename, max_age=ONE_YEAR, etag=filename)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,170 @@
+"""
+Write-time keyword tags for wardrobe items
+Each item's color, notes and category are normalized into wardrobe_item_tags when
+the item is flushed, so styler matching is an indexed join instead of ILIKE scans
+"""
+
+import re
+
+import click
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, Tag, WardrobeItem, wardrobe_item_tags
+
+TAGGED_FIELDS = ('color', 'notes', 'category')
+
+_WORD_RE = re.compile(r'[a-z0-9]+(?:-[a-z0-9]+)*')
+
+
+def _singular(word: str):
+    yield word
+    # naive singular so 'sneaker' finds 'sneakers' and 'heels' finds 'heel'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        yield word[:-1]
+
+
+def _variants(word: str):
+    # a compound is tagged whole, by every shorter run of its parts and by each part,
+    # so 'off-white-ish' carries 'off-white' as well as 'white'
+    parts = word.split('-')
+    for i in range(len(parts)):
+        for j in range(i + 1, len(parts) + 1):
+            yield from _singular('-'.join(parts[i:j]))
+
+
+def normalize(*texts) -> set:
+    names = set()
+    for t in texts:
+        for word in _WORD_RE.findall((t or '').lower()):
+            names.update(v for v in _variants(word) if len(v) <= 60)
+    return names
+
+
+def query_names(word: str) -> set:
+    """Tag names a keyword matches: its tokens whole, so 'off-white' never matches plain 'white'."""
+    return {v for token in _WORD_RE.findall((word or '').lower()) for v in _singular(token)}
+
+
+def item_tag_names(item) -> set:
+    return normalize(*(getattr(item, f) for f in TAGGED_FIELDS))
+
+
+def ensure_tags(conn, names) -> dict:
+    """Name -> id for `names`, creating missing Tag rows.
+
+    Two writers introducing the same new word both get past the SELECT, so
+    the INSERT skips names that already exist instead of failing the whole
+    save on the unique constraint.
+    """
+    table = Tag.__table__
+    names = set(names)
+    if not names:
+        return {}
+    by_name = dict(conn.execute(select(table.c.name, table.c.id).where(table.c.name.in_(names))).all())
+    missing = [{'name': n} for n in names - by_name.keys()]
+    if not missing:
+        return by_name
+    if conn.dialect.name in ('sqlite', 'postgresql'):
+        if conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        conn.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=[table.c.name]), missing)
+    else:
+        for row in missing:
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(table), row)
+            except IntegrityError:
+                pass  # created by a concurrent writer; picked up below
+    by_name.update(conn.execute(
+        select(table.c.name, table.c.id).where(table.c.name.in_([r['name'] for r in missing]))
+    ).all())
+    return by_name
+
+
+def _resolve(session, items) -> None:
+    """Assign tags to `items`, fetching or creating every Tag row in one pass."""
+    wanted = {id(item): item_tag_names(item) for item in items}
+    names = set().union(*wanted.values())
+    by_name = {}
+    if names:
+        with session.no_autoflush:
+            ids = ensure_tags(session.connection(), names)
+            by_name = {t.name: t for t in session.execute(select(Tag).where(Tag.id.in_(ids.values()))).scalars()}
+    for item in items:
+        item.tags = [by_name[n] for n in wanted[id(item)]]
+
+
+def _needs_retag(item) -> bool:
+    state = inspect(item)
+    if state.pending:
+        return True
+    return any(state.attrs[f].history.has_changes() for f in TAGGED_FIELDS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _tag_items_before_flush(session, flush_context, instances):
+    items = [o for o in list(session.new) + list(session.dirty)
+             if isinstance(o, WardrobeItem) and _needs_retag(o)]
+    if items:
+        with session.no_autoflush:
+            _resolve(session, items)
+
+
+def retag_rows(session, rows) -> None:
+    """Set-based re-tag after a bulk UPDATE; `rows` carry id and the TAGGED_FIELDS."""
+    wanted = {row.id: normalize(*(getattr(row, f) for f in TAGGED_FIELDS)) for row in rows}
+    if not wanted:
+        return
+    conn = session.connection()
+    by_name = ensure_tags(conn, set().union(*wanted.values()))
+    conn.execute(delete(wardrobe_item_tags).where(wardrobe_item_tags.c.item_id.in_(wanted)))
+    pairs = [{'item_id': item_id, 'tag_id': by_name[n]} for item_id, item_names in wanted.items()
+             for n in item_names]
+    if pairs:
+        conn.execute(insert(wardrobe_item_tags), pairs)
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def items_tagged_any(words):
+    """Subquery of item ids carrying any of the given keyword tags."""
+    names = set().union(*(query_names(w) for w in words))
+    tag_ids = select(Tag.id).where(Tag.name.in_(names))
+    return select(wardrobe_item_tags.c.item_id).where(wardrobe_item_tags.c.tag_id.in_(tag_ids))
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill(batch_size: int = 500, only_missing: bool = True) -> int:
+    count = 0
+    last_id = 0
+    while True:
+        stmt = select(WardrobeItem).where(WardrobeItem.id > last_id).order_by(WardrobeItem.id).limit(batch_size)
+        if only_missing:
+            stmt = stmt.where(~WardrobeItem.id.in_(select(wardrobe_item_tags.c.item_id)))
+        batch = db.session.execute(stmt).scalars().all()
+        if not batch:
+            break
+        _resolve(db.session, batch)
+        count += len(batch)
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+    return count
+
+
+def init_app(app) -> None:
+    @app.cli.command('tags-backfill')
+    @click.option('--all', 'rebuild_all', is_flag=True, help='Re-tag every item, not only untagged ones.')
+    @click.option('--batch-size', default=500, show_default=True)
+    def tags_backfill_command(rebuild_all, batch_size):
+        """Build keyword tags for existing wardrobe items."""
+        n = backfill(batch_size, only_missing=not rebuild_all)
+        click.echo(f'Tagged {n} wardrobe items.')
+
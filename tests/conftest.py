@@ -0,0 +1,89 @@
+"""
+Shared fixtures: one app over a throwaway SQLite database and upload folder,
+migrated once per session. Tests isolate themselves by creating their own users
+"""
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix='glamdiva-tests-')
+# Config reads the environment when it is imported, so this must precede any app import
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_TMP, 'test.db'),
+    'UPLOAD_FOLDER': os.path.join(_TMP, 'uploads'),
+    'PASSWORD_HASH_POOL': 'inline',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'IMAGE_PROCESSING': 'inline',
+    'STYLING_RULES_RELOAD': '0',
+})
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    import migrations
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        migrations.upgrade()
+    yield flask_app
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield app
+        from models import db
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(ctx):
+    """Create and commit a user; returns the User."""
+    from models import db, User
+    import passwords
+
+    def make(password: str = 'pw-123456'):
+        user = User(name='Test User', email=f'user{next(_emails)}@tests.glamdiva.dev',
+                    password_hash=passwords.hash_password(password))
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def add_item(ctx):
+    """Add and commit a wardrobe item through the ORM (so every flush hook runs)."""
+    from models import db, WardrobeItem
+
+    def add(user, **fields):
+        fields.setdefault('name', 'item')
+        fields.setdefault('category', 'Top')
+        item = WardrobeItem(user_id=user.id, **fields)
+        db.session.add(item)
+        db.session.commit()
+        return item
+    return add
+
+
+@pytest.fixture
+def login(app):
+    """A test client logged in as `user`."""
+    def login_as(user, password: str = 'pw-123456'):
+        client = app.test_client()
+        response = client.post('/login', data={'email': user.email, 'password': password})
+        assert response.status_code == 302
+        return client
+    return login_as
@@ -0,0 +1,105 @@
+import io
+import os
+
+from PIL import Image
+from sqlalchemy import func, select
+from werkzeug.datastructures import FileStorage
+
+from models import db, ImageFingerprint, UploadBlob, WardrobeItem, wardrobe_item_tags
+import bulk
+import duplicates
+import facets
+import search
+import storage
+import tags
+
+
+def png(rgb) -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (32, 32), rgb).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def stored(app, sha) -> bool:
+    return os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], f'{sha}.png'))
+
+
+def photo_item(user, rgb, **fields):
+    """An item whose photo goes through the upload path: blob reference plus fingerprint."""
+    sha, url = storage.save_upload(FileStorage(io.BytesIO(png(rgb)), filename='photo.png'))
+    item = WardrobeItem(user_id=user.id, name=fields.pop('name', 'photo item'),
+                        category=fields.pop('category', 'Top'), image_hash=sha, image_url=url, **fields)
+    db.session.add(item)
+    duplicates.fingerprint_upload(item)
+    db.session.commit()
+    return item
+
+
+def ref_count(sha):
+    return db.session.scalar(select(UploadBlob.ref_count).where(UploadBlob.sha256 == sha))
+
+
+def searchable(user_id, q) -> set:
+    return set(db.session.scalars(select(search.search_matches(user_id, q).c.item_id)))
+
+
+def tagged(ids) -> int:
+    return db.session.scalar(select(func.count()).select_from(wardrobe_item_tags)
+                             .where(wardrobe_item_tags.c.item_id.in_(ids)))
+
+
+def fingerprinted(ids) -> set:
+    return set(db.session.scalars(select(ImageFingerprint.item_id).where(ImageFingerprint.item_id.in_(ids))))
+
+
+def facets_consistent(*users) -> bool:
+    conn = db.session.connection()
+    ids = [u.id for u in users]
+    return facets.stored_counts(conn, ids) == facets.expected_counts(conn, ids)
+
+
+def test_delete_cleans_up_every_derived_row(make_user, add_item, ctx):
+    user, other = make_user(), make_user()
+    shared_a = photo_item(user, (200, 10, 10), name='quilted jacket', color='navy')
+    shared_b = photo_item(user, (200, 10, 10), name='quilted vest', color='navy')
+    solo = photo_item(user, (10, 200, 10), name='quilted skirt', category='Bottom', color='navy')
+    plain = add_item(user, name='quilted scarf', color='navy', notes='quilted wool')
+    foreign = add_item(other, name='quilted coat', color='navy')
+    shared_sha, solo_sha = shared_a.image_hash, solo.image_hash
+    assert shared_sha == shared_b.image_hash and ref_count(shared_sha) == 2
+    deleted = [shared_a.id, solo.id, plain.id]
+
+    result = bulk.apply(user, 'delete', deleted + [foreign.id, 10 ** 9])
+    db.session.commit()
+
+    assert (result.updated, result.missing) == (3, sorted([foreign.id, 10 ** 9]))
+    assert db.session.scalars(select(WardrobeItem.id).where(WardrobeItem.id.in_(deleted))).all() == []
+    # the shared photo keeps its other reference; the solo photo's row and files are purged
+    assert ref_count(shared_sha) == 1 and stored(ctx, shared_sha)
+    assert ref_count(solo_sha) is None and not stored(ctx, solo_sha)
+    assert searchable(user.id, 'quilted') == {shared_b.id}
+    assert tagged(deleted) == 0
+    assert fingerprinted(deleted + [shared_b.id]) == {shared_b.id}
+    assert facets_consistent(user, other)
+    # the other user's item was reported missing, not touched
+    assert searchable(other.id, 'quilted') == {foreign.id}
+    assert tagged([foreign.id]) > 0
+
+
+def test_recategorize_and_recolor_reindex_the_changed_items(make_user, add_item):
+    user = make_user()
+    tee = add_item(user, name='linen tee', category='Top', color='red')
+    shirt = add_item(user, name='linen shirt', category='Top', color='red')
+
+    bulk.apply(user, 'recategorize', [tee.id], category='Loungewear')
+    bulk.apply(user, 'recolor', [tee.id, shirt.id], color='olive')
+    db.session.commit()
+
+    def matched(word):
+        return set(db.session.scalars(select(WardrobeItem.id).where(
+            WardrobeItem.user_id == user.id, WardrobeItem.id.in_(tags.items_tagged_any([word])))))
+
+    assert matched('loungewear') == searchable(user.id, 'loungewear') == {tee.id}
+    assert matched('olive') == searchable(user.id, 'olive') == {tee.id, shirt.id}
+    assert matched('red') == searchable(user.id, 'red') == set()
+    assert facets_consistent(user)
@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def metrics_token(app):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    yield 's3cret'
+    app.config['METRICS_TOKEN'] = None
+
+
+def test_metrics_requires_the_bearer_token(app, metrics_token):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': f'Bearer {metrics_token}'})
+    assert response.status_code == 200
+
+
+def test_non_ascii_authorization_is_rejected_not_an_error(app, metrics_token):
+    client = app.test_client()
+    # a latin-1 header decodes to non-ASCII str, which hmac.compare_digest refuses to compare
+    response = client.get('/metrics', headers={'Authorization': 'Bearer café'})
+    assert response.status_code == 401
+
+
+def test_metrics_without_token_is_loopback_only(app):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 403
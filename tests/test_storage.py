@@ -0,0 +1,99 @@
+import io
+import os
+
+from PIL import Image
+from sqlalchemy import select
+from werkzeug.datastructures import FileStorage
+
+from models import db, UploadBlob
+import storage
+
+
+def png(rgb) -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (32, 32), rgb).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def upload(data: bytes, filename: str = 'photo.png'):
+    return storage.save_upload(FileStorage(io.BytesIO(data), filename=filename))
+
+
+def blob(sha):
+    return db.session.execute(select(UploadBlob.ref_count, UploadBlob.ext).where(UploadBlob.sha256 == sha)).first()
+
+
+def stored(app, sha, ext='.png') -> bool:
+    return os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], f'{sha}{ext}'))
+
+
+def leftovers(app) -> list:
+    return [n for n in os.listdir(app.config['UPLOAD_FOLDER']) if n.startswith(('.adopt-', '.upload-'))]
+
+
+def test_rollback_after_adopt_leaves_no_row_and_no_file(ctx):
+    sha, url = upload(png((1, 2, 3)))
+    assert os.path.exists(storage.local_path(url))  # readable (e.g. for fingerprinting) before commit
+    assert not stored(ctx, sha)
+    db.session.rollback()
+    assert blob(sha) is None
+    assert not stored(ctx, sha)
+    assert leftovers(ctx) == []
+
+
+def test_commit_moves_the_file_into_the_store(ctx):
+    sha, url = upload(png((4, 5, 6)))
+    db.session.commit()
+    assert blob(sha).ref_count == 1
+    assert stored(ctx, sha)
+    assert storage.local_path(url) == os.path.join(ctx.config['UPLOAD_FOLDER'], f'{sha}.png')
+    assert leftovers(ctx) == []
+
+
+def test_same_content_is_stored_once_with_one_reference_each(ctx):
+    data = png((7, 8, 9))
+    sha, _ = upload(data)
+    db.session.commit()
+    again, url = upload(data, 'copy.PNG')
+    assert again == sha
+    assert url == storage.blob_url(sha, '.png')
+    db.session.commit()
+    assert blob(sha).ref_count == 2
+    assert leftovers(ctx) == []
+
+
+def test_release_purges_files_only_at_zero_after_commit(ctx):
+    data = png((10, 11, 12))
+    sha, _ = upload(data)
+    upload(data)
+    db.session.commit()
+    variant = os.path.join(ctx.config['UPLOAD_FOLDER'], f'{sha}_thumb.webp')
+    open(variant, 'wb').close()
+
+    storage.release(sha)
+    db.session.commit()
+    assert blob(sha).ref_count == 1 and stored(ctx, sha)
+
+    storage.release(sha)
+    db.session.rollback()  # a failed delete keeps everything
+    assert blob(sha).ref_count == 1 and stored(ctx, sha)
+
+    storage.release(sha)
+    assert stored(ctx, sha)  # files go only once the transaction commits
+    db.session.commit()
+    assert blob(sha) is None
+    assert not stored(ctx, sha) and not os.path.exists(variant)
+
+
+def test_release_many_counts_every_reference(ctx):
+    data = png((13, 14, 15))
+    sha, _ = upload(data)
+    upload(data)
+    upload(data)
+    db.session.commit()
+    storage.release_many({sha: 2})
+    db.session.commit()
+    assert blob(sha).ref_count == 1
+    storage.release_many({sha: 1})
+    db.session.commit()
+    assert blob(sha) is None and not stored(ctx, sha)
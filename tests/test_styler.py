@@ -0,0 +1,45 @@
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+
+from app import styler_picks
+from models import db
+
+
+def _names(items):
+    return [item.name for item in items]
+
+
+def test_picks_prefer_keyword_matches_newest_first(make_user, add_item):
+    user = make_user()
+    for i in range(8):
+        add_item(user, name=f'tee {i}', color='red')
+    add_item(user, name='navy blazer', color='navy')
+    add_item(user, name='old navy coat', color='navy')
+    add_item(user, name='newest tee', color='red')
+
+    assert _names(styler_picks(user.id, ['navy'], limit=3)) == ['old navy coat', 'navy blazer']
+    assert _names(styler_picks(user.id, ['olive'], limit=3)) == ['newest tee', 'old navy coat', 'navy blazer']
+    assert _names(styler_picks(user.id, [], limit=2)) == ['newest tee', 'old navy coat']
+
+
+def test_picks_are_one_select_without_limit_inside_in(make_user, add_item):
+    user = make_user()
+    add_item(user, name='navy blazer', color='navy')
+    user_id = user.id
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(context.compiled.statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert _names(styler_picks(user_id, ['navy'])) == ['navy blazer']
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert len(statements) == 1
+    # MySQL: "This version of MySQL doesn't yet support 'LIMIT & IN/ALL/ANY/SOME subquery'"
+    sql = str(statements[0].compile(dialect=mysql.dialect())).upper()
+    for chunk in sql.split(' IN (')[1:]:
+        assert 'LIMIT' not in chunk.split(')')[0]
+    assert sql.count('LIMIT') == 2
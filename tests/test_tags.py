@@ -0,0 +1,50 @@
+from sqlalchemy import event, func, select
+
+from models import db, Tag, WardrobeItem
+import tags
+
+
+def test_hyphenated_keywords_match_whole_words(make_user, add_item):
+    user = make_user()
+    add_item(user, name='plain tee', color='white')
+    add_item(user, name='kurta', color='Off-White')
+    add_item(user, name='cream top', notes='off-white-ish trim')
+
+    def matched(*words):
+        ids = select(WardrobeItem.name).where(WardrobeItem.user_id == user.id,
+                                              WardrobeItem.id.in_(tags.items_tagged_any(words)))
+        return sorted(db.session.scalars(ids))
+
+    assert matched('off-white') == ['cream top', 'kurta']
+    assert matched('white') == ['cream top', 'kurta', 'plain tee']
+
+
+def test_tag_created_concurrently_does_not_fail_the_save(make_user, add_item):
+    """Another writer commits the same new word between our SELECT and INSERT."""
+    user = make_user()
+    word = 'zebraprint'
+    raced = []
+
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if not raced and statement.startswith('INSERT') and 'INTO tags' in statement:
+            raced.append(statement)
+            cursor.execute('INSERT INTO tags (name) VALUES (?)', (word,))
+
+    event.listen(db.engine, 'before_cursor_execute', race)
+    try:
+        item = add_item(user, name='scarf', notes=f'{word} pattern')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', race)
+
+    assert raced
+
+    assert db.session.scalar(select(func.count()).select_from(Tag).where(Tag.name == word)) == 1
+    assert word in {t.name for t in item.tags}
+
+
+def test_ensure_tags_returns_existing_and_new_ids(ctx):
+    conn = db.session.connection()
+    first = tags.ensure_tags(conn, {'houndstooth'})
+    both = tags.ensure_tags(conn, {'houndstooth', 'gingham'})
+    assert both['houndstooth'] == first['houndstooth']
+    assert set(both) == {'houndstooth', 'gingham'}
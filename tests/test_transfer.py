@@ -0,0 +1,62 @@
+import io
+
+from sqlalchemy import event, select
+
+from models import db, WardrobeItem
+import facets
+import search
+import tags
+import transfer
+
+
+def csv_rows(n: int, word: str) -> io.BytesIO:
+    lines = ['name,category,color,notes'] + [f'{word} shirt {i},Top,navy,{word} weave' for i in range(n)]
+    return io.BytesIO('\n'.join(lines).encode())
+
+
+def import_counting(user, data, chunk_size: int):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        result = transfer.import_items(user, data, 'csv', chunk_size=chunk_size)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return result, statements
+
+
+def test_one_chunk_costs_the_same_statements_at_any_size(make_user):
+    small_user, big_user = make_user(), make_user()
+    small, small_sql = import_counting(small_user, csv_rows(3, 'herringbone'), chunk_size=500)
+    big, big_sql = import_counting(big_user, csv_rows(60, 'houndstooth'), chunk_size=500)
+    assert (small.imported, big.imported) == (3, 60)
+    assert len(big_sql) == len(small_sql), big_sql
+    assert sum('wardrobe_items_fts' in s for s in big_sql) <= 1
+
+
+def test_imported_items_are_searchable_and_tagged(make_user):
+    user = make_user()
+    result = transfer.import_items(user, csv_rows(4, 'seersucker'), 'csv', chunk_size=3)
+    assert result.imported == 4
+
+    matches = search.search_matches(user.id, 'seersucker')
+    found = db.session.scalars(select(matches.c.item_id)).all()
+    tagged = db.session.scalars(select(WardrobeItem.id).where(
+        WardrobeItem.user_id == user.id, WardrobeItem.id.in_(tags.items_tagged_any(['seersucker'])))).all()
+    assert len(found) == len(tagged) == 4
+
+    conn = db.session.connection()
+    assert facets.stored_counts(conn, [user.id]) == facets.expected_counts(conn, [user.id])
+    assert set(db.session.scalars(select(WardrobeItem.color_hex).where(WardrobeItem.user_id == user.id))) == {'#000080'}
+
+
+def test_bad_rows_are_reported_not_imported(make_user):
+    user = make_user()
+    data = io.BytesIO(b'name,category\nok,Top\n,Top\n' + b'x' * 200 + b',Top\n')
+    result = transfer.import_items(user, data, 'csv')
+    assert result.imported == 1
+    assert result.skipped == 2
+    assert [e.split(':')[0] for e in result.errors] == ['line 3', 'line 4']
@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+from models import db, UploadSession, WardrobeItem
+import uploads
+
+
+def png(rgb) -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (48, 48), rgb).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def open_session(client, data: bytes, **fields):
+    fields.setdefault('filename', 'photo.png')
+    response = client.post('/api/uploads', json=dict(fields, size=len(data)))
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+
+def patch(client, upload_id, offset: int, chunk: bytes):
+    return client.patch(f'/api/uploads/{upload_id}', data=chunk, headers={'Upload-Offset': str(offset)})
+
+
+def partial_exists(upload_id) -> bool:
+    return os.path.exists(uploads.partial_path(upload_id))
+
+
+def test_chunks_resume_from_the_recorded_offset(make_user, login):
+    user = make_user()
+    client = login(user)
+    data = png((10, 20, 30))
+    upload_id = open_session(client, data, sha256=hashlib.sha256(data).hexdigest())
+    half = len(data) // 2
+
+    response = patch(client, upload_id, 0, data[:half])
+    assert response.status_code == 200
+    assert response.headers['Upload-Offset'] == str(half)
+
+    # a retried or skipped chunk is refused with the offset to resume from
+    for wrong in (0, half + 1):
+        response = patch(client, upload_id, wrong, data[half:])
+        assert response.status_code == 409
+        assert response.get_json()['offset'] == half
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == half
+
+    assert patch(client, upload_id, half, data[half:] + b'x').status_code == 400  # past the announced size
+    assert patch(client, upload_id, half, data[half:]).headers['Upload-Offset'] == str(len(data))
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', json={'name': 'scarf', 'category': 'Accessory'})
+    assert response.status_code == 201, response.get_json()
+    item = db.session.get(WardrobeItem, response.get_json()['item']['id'])
+    assert item.user_id == user.id
+    assert item.image_hash == hashlib.sha256(data).hexdigest()
+    assert db.session.get(UploadSession, upload_id) is None
+    assert not partial_exists(upload_id)
+
+
+def test_incomplete_upload_cannot_complete(make_user, login):
+    client = login(make_user())
+    data = png((40, 50, 60))
+    upload_id = open_session(client, data)
+    patch(client, upload_id, 0, data[:10])
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', json={'name': 'tee', 'category': 'Top'})
+    assert response.status_code == 409
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 10
+
+
+def test_checksum_mismatch_discards_the_session(make_user, login):
+    client = login(make_user())
+    data = png((70, 80, 90))
+    upload_id = open_session(client, data, sha256=hashlib.sha256(b'something else').hexdigest())
+    patch(client, upload_id, 0, data)
+    before = db.session.query(WardrobeItem).count()
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', json={'name': 'tee', 'category': 'Top'})
+    assert response.status_code == 422
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+    assert not partial_exists(upload_id)
+    assert db.session.query(WardrobeItem).count() == before
+
+
+def test_malformed_checksum_is_rejected(make_user, login):
+    client = login(make_user())
+    response = client.post('/api/uploads', json={'filename': 'photo.png', 'size': 10, 'sha256': 'abc'})
+    assert response.status_code == 400
+
+
+def test_sessions_are_private_to_their_owner(make_user, login):
+    data = png((1, 1, 1))
+    upload_id = open_session(login(make_user()), data)
+    other = login(make_user())
+    assert other.get(f'/api/uploads/{upload_id}').status_code == 404
+    assert patch(other, upload_id, 0, data).status_code == 404
+    assert other.delete(f'/api/uploads/{upload_id}').status_code == 404
+    assert partial_exists(upload_id)
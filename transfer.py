@@ -0,0 +1,224 @@
+"""
+Bulk wardrobe import/export (CSV and JSONL)
+Imports are parsed incrementally and inserted in chunked transactions, one
+multi-row INSERT per chunk; exports stream rows from a server-side cursor
+instead of building a list
+"""
+
+import csv
+import io
+import json
+import sys
+
+import click
+from sqlalchemy import func, insert, select
+
+from models import db, User, WardrobeItem
+import cache
+import colors
+import facets
+import search
+import tags
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ('id', 'name', 'category', 'color', 'notes', 'image_url', 'created_at')
+IMPORT_FIELDS = {'name': 120, 'category': 80, 'color': 60, 'notes': 255}
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def error(self, line: int, message: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+    def to_dict(self) -> dict:
+        return {'imported': self.imported, 'skipped': self.skipped, 'errors': self.errors}
+
+
+def guess_format(filename: str, default: str = 'csv') -> str:
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(ext, default)
+
+
+# -----------------------------
+# Import
+# -----------------------------
+def iter_records(binary_stream, fmt: str):
+    """Yield (line_number, dict-or-error-string) without reading the whole file."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, {(k or '').strip().lower(): v for k, v in row.items()}
+    elif fmt == 'jsonl':
+        for n, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield n, 'invalid JSON'
+                continue
+            yield n, record if isinstance(record, dict) else 'expected a JSON object'
+    else:
+        raise ValueError(f'Unsupported format {fmt!r}; use one of {", ".join(FORMATS)}.')
+
+
+def validate(record: dict):
+    """Return (cleaned fields, None) or (None, error message)."""
+    cleaned = {}
+    for field, max_len in IMPORT_FIELDS.items():
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ''
+        if len(value) > max_len:
+            return None, f'{field} is longer than {max_len} characters'
+        cleaned[field] = value or None
+    if not cleaned['name'] or not cleaned['category']:
+        return None, 'name and category are required'
+    return cleaned, None
+
+
+# columns the search index, keyword tags and facet counts are built from
+_INDEXED_COLUMNS = (WardrobeItem.id, WardrobeItem.user_id, WardrobeItem.name, WardrobeItem.notes,
+                    WardrobeItem.color, WardrobeItem.category, WardrobeItem.color_family, WardrobeItem.image_url)
+
+
+def insert_chunk(user, records) -> None:
+    """One executemany INSERT for `records`, then the state the ORM flush hooks would keep.
+
+    A Core INSERT skips those hooks (on SQLite the ORM would also insert row
+    by row to read back each id), so canonical colors, facet counts, the
+    search index and keyword tags are written here, set-based like bulk.py.
+    The caller commits.
+    """
+    conn = db.session.connection()
+    last_id = conn.scalar(select(func.max(WardrobeItem.id)).where(WardrobeItem.user_id == user.id)) or 0
+    conn.execute(insert(WardrobeItem), [
+        {'user_id': user.id, **fields, **colors.canonical_values(colors.parse_color(fields['color']))}
+        for fields in records
+    ])
+    # new ids are above this user's previous maximum; indexing reads what was stored
+    rows = conn.execute(select(*_INDEXED_COLUMNS).where(
+        WardrobeItem.user_id == user.id, WardrobeItem.id > last_id
+    )).all()
+    facets.apply_deltas(conn, facets.change_deltas(
+        user.id, (), [facets.item_values(r.category, r.color_family, r.image_url) for r in rows]
+    ))
+    search.get_backend().index_many(conn, rows)
+    tags.retag_rows(db.session, rows)
+    cache.invalidate_recommendations(user)
+
+
+def import_items(user, binary_stream, fmt: str, chunk_size: int = 500) -> ImportResult:
+    """Insert valid records for `user`, committing every `chunk_size` rows.
+
+    Each chunk costs a fixed number of statements (see insert_chunk) and one
+    transaction, so a bad row never rolls back earlier chunks and memory
+    stays bounded by the chunk size.
+    """
+    result = ImportResult()
+    chunk = []
+
+    def flush_chunk():
+        if not chunk:
+            return
+        insert_chunk(user, chunk)
+        db.session.commit()
+        result.imported += len(chunk)
+        chunk.clear()
+
+    for line, record in iter_records(binary_stream, fmt):
+        if isinstance(record, str):
+            result.error(line, record)
+            continue
+        fields, problem = validate(record)
+        if problem:
+            result.error(line, problem)
+            continue
+        chunk.append(fields)
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    flush_chunk()
+    return result
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def iter_items(user_id: int, batch_size: int = 500):
+    stmt = (
+        select(WardrobeItem)
+        .where(WardrobeItem.user_id == user_id)
+        .order_by(WardrobeItem.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for item in db.session.scalars(stmt):
+        yield {k: v for k, v in item.to_dict().items() if k in EXPORT_FIELDS}
+
+
+def export_chunks(user_id: int, fmt: str):
+    """Generator of text chunks (one per item, plus a CSV header)."""
+    if fmt == 'jsonl':
+        for row in iter_items(user_id):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+    if fmt != 'csv':
+        raise ValueError(f'Unsupported format {fmt!r}; use one of {", ".join(FORMATS)}.')
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in iter_items(user_id):
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.getvalue():
+        yield buf.getvalue()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _user_by_email(email: str) -> User:
+    user = User.query.filter_by(email=email.strip().lower()).first()
+    if not user:
+        raise click.ClickException(f'No user with email {email}.')
+    return user
+
+
+def init_app(app) -> None:
+    @app.cli.command('wardrobe-import')
+    @click.argument('email')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+    @click.option('--chunk-size', default=500, show_default=True)
+    def wardrobe_import_command(email, path, fmt, chunk_size):
+        """Import wardrobe items for EMAIL from a CSV or JSONL file."""
+        user = _user_by_email(email)
+        with open(path, 'rb') as fh:
+            result = import_items(user, fh, fmt or guess_format(path), chunk_size)
+        click.echo(f'Imported {result.imported} items, skipped {result.skipped}.')
+        for message in result.errors:
+            click.echo(f'  {message}', err=True)
+
+    @app.cli.command('wardrobe-export')
+    @click.argument('email')
+    @click.argument('path', default='-')
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+    def wardrobe_export_command(email, path, fmt):
+        """Export EMAIL's wardrobe to PATH (or stdout) as CSV or JSONL."""
+        user = _user_by_email(email)
+        fmt = fmt or guess_format(path)
+        out = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        try:
+            for chunk in export_chunks(user.id, fmt):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,220 @@
+"""
+Resumable chunked uploads
+A client opens a session with the file's total size (and ideally its SHA-256),
+sends the bytes in PATCH chunks at explicit offsets, each streamed straight
+into a partial file, and then completes it: the checksum is verified and the
+file joins the content-addressed store. An interrupted chunk keeps whatever
+bytes arrived, so the client asks for the offset and carries on. Sessions left
+idle past UPLOAD_SESSION_TTL are garbage-collected
+"""
+
+import hashlib
+import os
+import re
+import secrets
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from PIL import Image
+from sqlalchemy import delete, func, select, update
+from werkzeug.exceptions import ClientDisconnected
+
+from models import db, UploadSession
+import storage
+
+PARTIAL_DIR = '.partial'
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(upload_id: str) -> str:
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIR, upload_id)
+
+
+def expires_at(upload) -> datetime:
+    return upload.updated_at + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+
+
+# -----------------------------
+# Sessions
+# -----------------------------
+def create(user_id: int, filename: str, size: int, checksum=None) -> UploadSession:
+    """Open a session and its empty partial file (the caller commits)."""
+    config = current_app.config
+    if size <= 0:
+        raise UploadError('size must be a positive number of bytes.')
+    if size > config['UPLOAD_MAX_SIZE']:
+        raise UploadError(f"Images can be at most {config['UPLOAD_MAX_SIZE'] // (1024 * 1024)}MB.", 413)
+    checksum = (checksum or '').strip().lower() or None
+    if checksum and not _SHA256_RE.match(checksum):
+        raise UploadError('sha256 must be 64 hex characters.')
+
+    collect_garbage(limit=20)
+    open_sessions = db.session.scalar(
+        select(func.count()).select_from(UploadSession).where(UploadSession.user_id == user_id)
+    )
+    if open_sessions >= config['UPLOAD_SESSIONS_PER_USER']:
+        raise UploadError('Too many unfinished uploads; complete or cancel one first.', 429)
+
+    upload = UploadSession(
+        id=secrets.token_hex(16), user_id=user_id, filename=filename[:255],
+        ext=os.path.splitext(filename)[1].lower()[:10], size=size, received=0, checksum=checksum,
+    )
+    os.makedirs(os.path.dirname(partial_path(upload.id)), exist_ok=True)
+    open(partial_path(upload.id), 'wb').close()
+    db.session.add(upload)
+    return upload
+
+
+def get(user_id: int, upload_id: str) -> UploadSession:
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id:
+        raise UploadError('Upload not found or expired.', 404)
+    return upload
+
+
+def write_chunk(upload, offset: int, stream, length: int) -> int:
+    """Stream `length` bytes from `stream` into the partial file at `offset`; returns the new offset.
+
+    Chunks must arrive in order: an offset other than the current one is a 409
+    and the client should resume from the offset it is told. The caller commits.
+    """
+    if offset != upload.received:
+        raise UploadError(f'Expected offset {upload.received}.', 409)
+    if length <= 0:
+        raise UploadError('Chunks need a Content-Length.', 411)
+    if length > current_app.config['UPLOAD_CHUNK_MAX']:
+        raise UploadError(f"Chunks can be at most {current_app.config['UPLOAD_CHUNK_MAX']} bytes.", 413)
+    if offset + length > upload.size:
+        raise UploadError('Chunk runs past the announced size.', 400)
+
+    written = 0
+    try:
+        with open(partial_path(upload.id), 'r+b') as out:
+            out.seek(offset)
+            while written < length:
+                chunk = stream.read(min(storage.CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                out.write(chunk)
+                written += len(chunk)
+    except ClientDisconnected:
+        pass  # keep what arrived; the client resumes from the recorded offset
+    except FileNotFoundError:
+        raise UploadError('Upload not found or expired.', 404)
+    finally:
+        _advance(upload, offset, written)
+    return upload.received
+
+
+def _advance(upload, offset: int, written: int) -> None:
+    if not written:
+        return
+    # conditional on the offset we started from, so two racing requests can't both advance it
+    result = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload.id, UploadSession.received == offset)
+        .values(received=offset + written, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.refresh(upload)
+    if result.rowcount == 0:
+        raise UploadError(f'Expected offset {upload.received}.', 409)
+
+
+def complete(upload) -> tuple:
+    """Verify and store a fully received upload; returns (sha256, url) like storage.save_upload.
+
+    A checksum mismatch discards the session: the bytes are wrong somewhere and
+    the client has to start over. The caller commits.
+    """
+    if upload.received != upload.size:
+        raise UploadError(f'Upload incomplete: {upload.received} of {upload.size} bytes received.', 409)
+    path = partial_path(upload.id)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(storage.CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    if upload.checksum and sha != upload.checksum:
+        discard(upload)
+        raise UploadError('Checksum mismatch; the upload was discarded.', 422)
+    try:
+        with Image.open(path) as im:
+            im.verify()
+    except Exception:
+        discard(upload)
+        raise UploadError('The uploaded file is not a readable image.', 415)
+
+    url = storage.adopt_file(path, sha, upload.ext, upload.size)
+    discard(upload)
+    return sha, url
+
+
+def discard(upload) -> None:
+    """Delete the session and its partial file (the caller commits)."""
+    try:
+        os.remove(partial_path(upload.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+
+
+# -----------------------------
+# Garbage collection
+# -----------------------------
+def collect_garbage(limit=None) -> int:
+    """Drop sessions idle past UPLOAD_SESSION_TTL plus partial files no session owns."""
+    ttl = current_app.config['UPLOAD_SESSION_TTL']
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    stmt = select(UploadSession.id).where(UploadSession.updated_at < cutoff).order_by(UploadSession.updated_at)
+    if limit:
+        stmt = stmt.limit(limit)
+    expired = db.session.scalars(stmt).all()
+    for upload_id in expired:
+        try:
+            os.remove(partial_path(upload_id))
+        except FileNotFoundError:
+            pass
+    if expired:
+        db.session.execute(delete(UploadSession).where(UploadSession.id.in_(expired)))
+    if limit:
+        return len(expired)
+
+    # full sweep only: orphans left by a crash between creating the file and committing the row
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIR)
+    names = os.listdir(folder) if os.path.isdir(folder) else []
+    known = set(db.session.scalars(select(UploadSession.id).where(UploadSession.id.in_(names)))) if names else set()
+    orphans = 0
+    for name in names:
+        path = os.path.join(folder, name)
+        if name not in known and os.path.getmtime(path) < time.time() - ttl:
+            os.remove(path)
+            orphans += 1
+    return len(expired) + orphans
+
+
+def status(upload) -> dict:
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'expires_at': expires_at(upload).isoformat() + 'Z',
+    }
+
+
+def init_app(app) -> None:
+    @app.cli.command('uploads-gc')
+    def uploads_gc_command():
+        """Delete abandoned resumable-upload sessions and their partial files."""
+        n = collect_garbage()
+        db.session.commit()
+        click.echo(f'Removed {n} abandoned uploads.')